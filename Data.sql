@@ -26,9 +26,9 @@ INSERT INTO products (name, category, price, quantity, expiration_date, supplier
 ('Батон нарезной', 'Выпечка', 35.00, 80, '2025-10-05', 1),
 ('Апельсины', 'Фрукты', 150.00, 60, '2025-12-31', 2);
 
--- Заказы
+-- Заказы (сумма - позиции за вычетом возвратов: 45 + 70 - 70)
 INSERT INTO orders (customer_id, cashier_id, total_amount, status) VALUES
-(1, 1, 115.00, 'paid'),
+(1, 1, 45.00, 'paid'),
 (2, 2, 120.00, 'new');
 
 -- Позиции заказов
@@ -39,4 +39,5 @@ INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES
 
 -- Возвраты
 INSERT INTO returns (order_id, product_id, amount_refunded) VALUES
-(1, 2, 70.00);
\ No newline at end of file
+(1, 2, 70.00);
+UPDATE orders SET has_returns = true WHERE id IN (SELECT order_id FROM returns);
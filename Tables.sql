@@ -33,7 +33,8 @@ CREATE TABLE products (
     price DECIMAL(10,2) NOT NULL,
     quantity INTEGER NOT NULL,
     expiration_date DATE,
-    supplier_id BIGINT REFERENCES suppliers(id)
+    supplier_id BIGINT REFERENCES suppliers(id),
+    updated_at TIMESTAMP NOT NULL DEFAULT now()
 );
 
 -- Таблица заказов
@@ -42,7 +43,9 @@ CREATE TABLE orders (
     customer_id BIGINT NOT NULL REFERENCES customers(id),
     cashier_id BIGINT NOT NULL REFERENCES cashiers(id),
     total_amount DECIMAL(10,2) NOT NULL,
-    status VARCHAR(50) NOT NULL DEFAULT 'new'
+    status VARCHAR(50) NOT NULL DEFAULT 'new',
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    has_returns BOOLEAN NOT NULL DEFAULT false
 );
 
 -- Таблица позиций заказа
@@ -51,7 +54,8 @@ CREATE TABLE order_items (
     order_id BIGINT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
     product_id BIGINT NOT NULL REFERENCES products(id),
     quantity INTEGER NOT NULL CHECK (quantity > 0),
-    unit_price DECIMAL(10,2) NOT NULL
+    unit_price DECIMAL(10,2) NOT NULL,
+    reserved BOOLEAN NOT NULL DEFAULT false
 );
 
 -- Таблица возвратов
@@ -59,5 +63,78 @@ CREATE TABLE returns (
     id BIGSERIAL PRIMARY KEY,
     order_id BIGINT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
     product_id BIGINT NOT NULL REFERENCES products(id),
-    amount_refunded DECIMAL(10,2) NOT NULL
-);
\ No newline at end of file
+    amount_refunded DECIMAL(10,2) NOT NULL,
+    quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0)
+);
+
+-- Дневная сводка продаж по товарам и кассирам
+CREATE TABLE sales_daily (
+    day DATE NOT NULL,
+    product_id BIGINT NOT NULL,
+    cashier_id BIGINT NOT NULL,
+    quantity BIGINT NOT NULL,
+    revenue DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (day, product_id, cashier_id)
+);
+
+-- Отметки инкрементального обновления сводок
+CREATE TABLE rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_order_item_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO rollup_state (name) VALUES ('sales_daily');
+
+-- Позиции выше отметки rollup_state, уже учтённые в сводке
+CREATE TABLE sales_daily_processed (
+    order_item_id BIGINT PRIMARY KEY,
+    processed_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Текущие предупреждения по срокам годности и остаткам
+CREATE TABLE stock_alerts (
+    product_id BIGINT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    supplier_id BIGINT,
+    quantity INTEGER NOT NULL,
+    expiration_date DATE,
+    low_stock BOOLEAN NOT NULL,
+    expiring BOOLEAN NOT NULL,
+    detected_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Отметка и параметры последнего запуска проверки сроков и остатков
+CREATE TABLE stock_monitor_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_run TIMESTAMP,
+    horizon DATE,
+    low_stock_threshold INTEGER,
+    expiry_days INTEGER
+);
+
+INSERT INTO stock_monitor_state (name) VALUES ('stock_alerts');
+
+-- Версии таблиц для ETag: версия таблицы - сумма её шардов, строки увеличивают триггеры
+CREATE TABLE table_versions (
+    table_name VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name, shard)
+);
+
+INSERT INTO table_versions (table_name, shard)
+SELECT t.table_name, s.shard FROM (VALUES ('products'), ('order_items')) AS t(table_name)
+CROSS JOIN generate_series(0, 15) AS s(shard);
+
+-- Ключи идемпотентности и сохранённые ответы на запросы записи
+CREATE TABLE idempotency_keys (
+    key VARCHAR(200) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status_code INTEGER,
+    content_type VARCHAR(100),
+    body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX idempotency_keys_expires_at_idx ON idempotency_keys (expires_at);
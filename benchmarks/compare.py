@@ -0,0 +1,37 @@
+import argparse
+import json
+from pathlib import Path
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "throughput_rps")
+
+def change(old, new):
+    """Изменение в процентах (None, если сравнивать не с чем)"""
+    if old in (None, 0) or new is None:
+        return None
+    return round((new - old) / old * 100, 1)
+
+def compare(baseline: dict, candidate: dict):
+    rows = {}
+    for label in sorted(set(baseline["endpoints"]) | set(candidate["endpoints"])):
+        old = baseline["endpoints"].get(label, {})
+        new = candidate["endpoints"].get(label, {})
+        rows[label] = {metric: {"baseline": old.get(metric), "candidate": new.get(metric),
+                                "change_percent": change(old.get(metric), new.get(metric))}
+                       for metric in METRICS}
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение двух прогонов нагрузочного теста")
+    parser.add_argument("baseline", help="JSON базового прогона")
+    parser.add_argument("candidate", help="JSON нового прогона")
+    args = parser.parse_args()
+
+    rows = compare(json.loads(Path(args.baseline).read_text(encoding="utf-8")),
+                   json.loads(Path(args.candidate).read_text(encoding="utf-8")))
+    for label, metrics in rows.items():
+        parts = []
+        for metric, values in metrics.items():
+            delta = values["change_percent"]
+            parts.append(f"{metric}={values['candidate']} ({'+' if delta and delta > 0 else ''}{delta}%)"
+                         if delta is not None else f"{metric}={values['candidate']}")
+        print(f"{label:40} " + "  ".join(parts))
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from collections import defaultdict
+from pathlib import Path
+import httpx
+
+#сценарии нагрузки и их доли в общем потоке
+SCENARIO_WEIGHTS = {"checkout": 0.5, "catalog": 0.4, "reporting": 0.1}
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+class LatencyRecorder:
+    """Задержки запросов по эндпоинтам (шаблон пути, а не конкретный URL)"""
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, method: str, label: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[label] += 1
+            return None
+        return response
+
+def percentile(sorted_values, share: float):
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return None
+    rank = max(int(round(share * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(recorder: LatencyRecorder, elapsed: float):
+    endpoints = {}
+    for label in sorted(set(recorder.latencies) | set(recorder.errors)):
+        values = sorted(recorder.latencies[label])
+        endpoints[label] = {
+            "count": len(values),
+            "errors": recorder.errors[label],
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+            "p50_ms": round(percentile(values, 0.50) * 1000, 3) if values else None,
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3) if values else None,
+            "p99_ms": round(percentile(values, 0.99) * 1000, 3) if values else None,
+            "max_ms": round(values[-1] * 1000, 3) if values else None
+        }
+    return endpoints
+
+async def load_reference_data(client: httpx.AsyncClient):
+    """id покупателей, кассиров, товаров и категории для генерации запросов"""
+    customers = (await client.get("/customers", params={"limit": 1000})).json()["customers"]
+    cashiers = (await client.get("/cashiers")).json()["cashiers"]
+    products = (await client.get("/products", params={"limit": 1000})).json()["products"]
+    if not customers or not cashiers or not products:
+        raise SystemExit("в базе нет покупателей, кассиров или товаров - запустите с --seed")
+    return {
+        "customer_ids": [customer["id"] for customer in customers],
+        "cashier_ids": [cashier["id"] for cashier in cashiers],
+        "products": products,
+        "categories": sorted({product["category"] for product in products if product["category"]})
+    }
+
+async def checkout_scenario(client, recorder, data, rng: random.Random, basket_size: int):
+    """Касса: корзина одним запросом либо поштучное сканирование, затем завершение заказа"""
+    customer_id = rng.choice(data["customer_ids"])
+    cashier_id = rng.choice(data["cashier_ids"])
+    lines = rng.sample(data["products"], min(basket_size, len(data["products"])))
+    if rng.random() < 0.5:
+        items = [{"product_id": p["id"], "quantity": 1, "unit_price": p["price"]} for p in lines]
+        response = await recorder.request(client, "POST", "POST /orders/basket", "/orders/basket", json={
+            "customer_id": customer_id, "cashier_id": cashier_id, "items": items
+        })
+        order_id = response.json()["order"]["id"] if response else None
+    else:
+        response = await recorder.request(client, "POST", "POST /orders", "/orders", json={
+            "customer_id": customer_id, "cashier_id": cashier_id
+        })
+        order_id = response.json()["id"] if response else None
+        for product in lines if order_id else []:
+            await recorder.request(client, "POST", "POST /order-items", "/order-items", json={
+                "order_id": order_id, "product_id": product["id"], "quantity": 1, "unit_price": product["price"]
+            })
+    if order_id:
+        await recorder.request(client, "GET", "GET /orders/{order_id}", f"/orders/{order_id}")
+        await recorder.request(client, "PUT", "PUT /orders/{order_id}/complete", f"/orders/{order_id}/complete")
+
+async def catalog_scenario(client, recorder, data, rng: random.Random):
+    """Просмотр каталога: страница списка, категория, карточка товара"""
+    after_id = rng.choice(data["products"])["id"]
+    await recorder.request(client, "GET", "GET /products", "/products", params={"limit": 100, "after_id": after_id})
+    if data["categories"]:
+        category = rng.choice(data["categories"])
+        await recorder.request(client, "GET", "GET /products/category/{category}", f"/products/category/{category}")
+    product_id = rng.choice(data["products"])["id"]
+    await recorder.request(client, "GET", "GET /products/{product_id}", f"/products/{product_id}")
+
+async def reporting_scenario(client, recorder, data, rng: random.Random):
+    """Отчёты: выручка по категориям, топ товаров, статусы заказов"""
+    await recorder.request(client, "GET", "GET /analytics/revenue/category", "/analytics/revenue/category")
+    await recorder.request(client, "GET", "GET /analytics/revenue/product", "/analytics/revenue/product")
+    await recorder.request(client, "GET", "GET /analytics/revenue/status", "/analytics/revenue/status")
+
+async def worker(client, recorder, data, deadline: float, seed: int, basket_size: int, scenario_counts):
+    rng = random.Random(seed)
+    names = list(SCENARIO_WEIGHTS)
+    weights = [SCENARIO_WEIGHTS[name] for name in names]
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        if scenario == "checkout":
+            await checkout_scenario(client, recorder, data, rng, basket_size)
+        elif scenario == "catalog":
+            await catalog_scenario(client, recorder, data, rng)
+        else:
+            await reporting_scenario(client, recorder, data, rng)
+        scenario_counts[scenario] += 1
+
+async def run_load(base_url: str, concurrency: int, duration: float, basket_size: int, seed: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0, limits=limits) as client:
+        data = await load_reference_data(client)
+        recorder = LatencyRecorder()
+        scenario_counts = defaultdict(int)
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            worker(client, recorder, data, deadline, seed + index, basket_size, scenario_counts)
+            for index in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    return {
+        "meta": {
+            "base_url": base_url,
+            "concurrency": concurrency,
+            "duration_seconds": round(elapsed, 3),
+            "basket_size": basket_size,
+            "seed": seed,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(time.time() - elapsed)),
+            "python": platform.python_version(),
+            "git_commit": os.popen(f'git -C "{ROOT_DIR}" rev-parse --short HEAD').read().strip() or None
+        },
+        "scenarios": dict(scenario_counts),
+        "endpoints": summarize(recorder, elapsed)
+    }
+
+def prepare_database(scale: float):
+    """Создание схемы и таблиц в локальной БД (DATABASE_URL), миграции и генерация данных"""
+    if not os.getenv("DATABASE_URL"):
+        raise SystemExit("для --seed задайте DATABASE_URL локальной тестовой базы")
+    from sqlalchemy import text
+    from sqlmodel import Session
+    from database import get_engine
+    from migrate import apply_migrations
+    from seed import seed_large_dataset
+
+    engine = get_engine()
+    with engine.begin() as connection:
+        connection.exec_driver_sql('CREATE SCHEMA IF NOT EXISTS "Demyanenko"')
+        exists = connection.execute(text("SELECT to_regclass('\"Demyanenko\".orders')")).scalar()
+        if exists is None:
+            connection.exec_driver_sql((ROOT_DIR / "Tables.sql").read_text(encoding="utf-8"))
+    apply_migrations(engine)
+    with Session(engine) as session:
+        seed_large_dataset(session, scale)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест API минимаркета")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="адрес запущенного приложения")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременных клиентов")
+    parser.add_argument("--duration", type=float, default=30.0, help="длительность, секунды")
+    parser.add_argument("--basket-size", type=int, default=10, help="позиций в одном заказе")
+    parser.add_argument("--seed", action="store_true", help="подготовить локальную БД и сгенерировать данные")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель объёма данных для --seed")
+    parser.add_argument("--random-seed", type=int, default=42, help="зерно генератора запросов")
+    parser.add_argument("--output", default="bench_output.json", help="файл с результатами (JSON)")
+    args = parser.parse_args()
+
+    if args.seed:
+        prepare_database(args.scale)
+    results = asyncio.run(run_load(args.url, args.concurrency, args.duration, args.basket_size, args.random_seed))
+    Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    for label, stats in results["endpoints"].items():
+        print(f"{label:40} n={stats['count']:6} err={stats['errors']:4} "
+              f"p50={stats['p50_ms']} p95={stats['p95_ms']} p99={stats['p99_ms']} мс  {stats['throughput_rps']} rps")
+    print(f"результаты записаны в {args.output}")
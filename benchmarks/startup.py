@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+#импорт приложения в чистом процессе: время импорта модуля main вместе со всеми зависимостями
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_import(env):
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+def measure_first_request(env, path: str, timeout: float):
+    """Запуск uvicorn и опрос path до первого ответа: время от запуска процесса до первого запроса"""
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT_DIR, env=env
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while True:
+                try:
+                    response = client.get(path)
+                    break
+                except httpx.TransportError:
+                    if time.perf_counter() - started > timeout or process.poll() is not None:
+                        raise SystemExit(f"приложение не ответило на {path} за {timeout} с")
+                    time.sleep(0.01)
+            first_request = time.perf_counter() - started
+            #разбивка изнутри процесса: импорт, lifespan, первый запрос от начала импорта
+            phases = client.get("/startup").json()
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return {"first_request_seconds": first_request, "status_code": response.status_code, "phases": phases}
+
+def summarize(values):
+    return {"median": round(statistics.median(values), 4), "max": round(max(values), 4), "min": round(min(values), 4)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Время импорта приложения и холодного старта до первого запроса")
+    parser.add_argument("--runs", type=int, default=5, help="число запусков")
+    parser.add_argument("--path", default="/", help="первый запрос (/ - без обращения к БД)")
+    parser.add_argument("--budget", type=float, default=1.0, help="допустимая медиана до первого запроса, секунды")
+    parser.add_argument("--timeout", type=float, default=30.0, help="ожидание первого ответа, секунды")
+    parser.add_argument("--output", default="startup_output.json", help="файл с результатами (JSON)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    #фоновые проверка остатков и обновление сводки не должны обращаться к БД во время замера
+    env.setdefault("STOCK_MONITOR_INTERVAL", "0")
+    env.setdefault("SALES_ROLLUP_INTERVAL", "0")
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    starts = [measure_first_request(env, args.path, args.timeout) for _ in range(args.runs)]
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "path": args.path,
+        "import_seconds": summarize(imports),
+        "first_request_seconds": summarize([start["first_request_seconds"] for start in starts]),
+        "lifespan_seconds": summarize([start["phases"]["lifespan"] for start in starts]),
+        "status_codes": sorted({start["status_code"] for start in starts}),
+        "budget_seconds": args.budget
+    }
+    Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"импорт main: медиана {results['import_seconds']['median']} с, максимум {results['import_seconds']['max']} с")
+    print(f"lifespan: медиана {results['lifespan_seconds']['median']} с")
+    print(f"до первого ответа {args.path}: медиана {results['first_request_seconds']['median']} с, "
+          f"максимум {results['first_request_seconds']['max']} с (бюджет {args.budget} с)")
+    print(f"результаты записаны в {args.output}")
+    sys.exit(1 if results["first_request_seconds"]["median"] > args.budget else 0)
@@ -0,0 +1,185 @@
+import argparse
+import queue
+import threading
+import psycopg2
+from sqlmodel import Session
+from cache import product_cache
+
+#колонки, которые можно загружать из CSV, и обязательные для новых строк
+IMPORT_TABLES = {
+    "products": {
+        "columns": ["id", "name", "category", "price", "quantity", "expiration_date", "supplier_id"],
+        "required": ["name", "price", "quantity"]
+    },
+    "customers": {
+        "columns": ["id", "first_name", "last_name", "phone", "email"],
+        "required": ["first_name", "last_name"]
+    }
+}
+#колонки выгрузки по таблицам
+EXPORT_TABLES = {
+    "products": ["id", "name", "category", "price", "quantity", "expiration_date", "supplier_id"],
+    "customers": ["id", "first_name", "last_name", "phone", "email"],
+    "orders": ["id", "customer_id", "cashier_id", "total_amount", "status", "created_at"],
+    "order_items": ["id", "order_id", "product_id", "quantity", "unit_price"]
+}
+#размер очереди кусков при потоковой выгрузке (ограничивает память)
+EXPORT_QUEUE_SIZE = 64
+
+class BulkImportError(ValueError):
+    """Некорректный CSV для загрузки"""
+
+def read_header(file):
+    """Первая строка CSV - имена колонок; файл остаётся на начале данных"""
+    line = file.readline()
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    return [column.strip().strip('"') for column in line.strip().split(",") if column.strip()]
+
+def import_csv(session: Session, table: str, file):
+    """Загрузка CSV через COPY FROM STDIN во временную таблицу и upsert в основную.
+    Строки с id обновляют существующие записи (или вставляются с этим id), строки без id добавляются как новые.
+    При повторе id в файле применяется последняя строка с этим id.
+    Файл читается потоком, целиком в память не загружается."""
+    spec = IMPORT_TABLES.get(table)
+    if spec is None:
+        raise BulkImportError(f"загрузка в таблицу {table} не поддерживается")
+    columns = read_header(file)
+    unknown = [column for column in columns if column not in spec["columns"]]
+    missing = [column for column in spec["required"] if column not in columns]
+    if unknown or missing or not columns:
+        raise BulkImportError(f"неизвестные колонки: {unknown}, отсутствуют обязательные: {missing}")
+
+    target = f'"Demyanenko".{table}'
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    data_columns = [column for column in columns if column != "id"]
+    data_list = ", ".join(data_columns)
+
+    try:
+        cursor = session.connection().connection.cursor()
+        #временная таблица без ограничений и значений по умолчанию, удаляется при commit
+        cursor.execute(f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT * FROM {target} WITH NO DATA")
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')", file)
+        staged = cursor.rowcount
+
+        updated = inserted = 0
+        if "id" in columns:
+            updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in data_columns)
+            #повторяющийся id в CSV: ON CONFLICT не может обновить строку дважды, берётся последняя строка файла
+            cursor.execute(f"""
+                INSERT INTO {target} (id, {data_list})
+                SELECT DISTINCT ON (id) id, {data_list} FROM {staging} WHERE id IS NOT NULL
+                ORDER BY id, ctid DESC
+                ON CONFLICT (id) DO UPDATE SET {updates}
+                RETURNING (xmax = 0)
+            """)
+            for (is_insert,) in cursor:
+                inserted += is_insert
+                updated += not is_insert
+            #последовательность id не должна выдать уже занятые загруженные id
+            cursor.execute(f"""
+                SELECT setval(pg_get_serial_sequence('{target}', 'id'), GREATEST((SELECT MAX(id) FROM {target}), 1))
+            """)
+        cursor.execute(f"""
+            INSERT INTO {target} ({data_list})
+            SELECT {data_list} FROM {staging} {"WHERE id IS NULL" if "id" in columns else ""}
+        """)
+        inserted += cursor.rowcount
+        session.commit()
+    except (psycopg2.DataError, psycopg2.IntegrityError) as error:
+        #неверное значение или NULL в обязательной колонке: ошибка COPY содержит номер строки CSV
+        session.rollback()
+        raise BulkImportError(f"ошибка загрузки: {str(error).strip()}") from error
+
+    if table == "products":
+        product_cache.clear()
+    return {"table": table, "rows": staged, "inserted": inserted, "updated": updated}
+
+def export_sql(table: str):
+    columns = EXPORT_TABLES.get(table)
+    if columns is None:
+        raise BulkImportError(f"выгрузка таблицы {table} не поддерживается")
+    return (f'COPY (SELECT {", ".join(columns)} FROM "Demyanenko".{table} ORDER BY id) '
+            f"TO STDOUT WITH (FORMAT csv, HEADER, ENCODING 'UTF8')")
+
+def export_csv_to_file(engine, table: str, file):
+    """Выгрузка таблицы в файл через COPY TO STDOUT"""
+    connection = engine.raw_connection()
+    try:
+        connection.cursor().copy_expert(export_sql(table), file)
+        connection.commit()
+    finally:
+        connection.close()
+
+class ExportCancelled(Exception):
+    """Клиент перестал читать выгрузку"""
+
+class QueueWriter:
+    """Файлоподобный приёмник для copy_expert: куски данных уходят в ограниченную очередь"""
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+
+    def write(self, data):
+        while True:
+            if self.cancelled.is_set():
+                #исключение внутри write прерывает COPY
+                raise ExportCancelled()
+            try:
+                self.chunks.put(data, timeout=1)
+                return len(data)
+            except queue.Full:
+                continue
+
+def stream_csv_export(engine, table: str):
+    """Потоковая выгрузка через COPY TO STDOUT: COPY идёт в отдельном потоке,
+    генератор отдаёт куски по мере чтения клиентом (память ограничена размером очереди)"""
+    sql = export_sql(table)
+    chunks = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+    cancelled = threading.Event()
+    done = object()
+
+    def run_copy():
+        try:
+            export_csv_to_file(engine, table, QueueWriter(chunks, cancelled))
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            chunks.put(error)
+        finally:
+            chunks.put(done)
+
+    threading.Thread(target=run_copy, name=f"copy-export-{table}", daemon=True).start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        cancelled.set()
+        #освобождаем место в очереди, чтобы поток COPY увидел отмену
+        while not chunks.empty():
+            chunks.get_nowait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Массовая загрузка и выгрузка CSV через COPY")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("table", help="products, customers (загрузка); также orders, order_items (выгрузка)")
+    parser.add_argument("path", help="CSV-файл")
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    engine = get_engine()
+    if args.action == "import":
+        with open(args.path, "rb") as file, Session(engine) as session:
+            print(import_csv(session, args.table, file))
+    else:
+        export_sql(args.table)
+        with open(args.path, "wb") as file:
+            export_csv_to_file(engine, args.table, file)
+        print(f"таблица {args.table} выгружена в {args.path}")
@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from models import Product
+
+#настройки кэша каталога (переопределяются переменными окружения)
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "50000"))
+
+class ProductCache:
+    """Кэш каталога товаров в памяти процесса: TTL + LRU, вторичный индекс по категории.
+
+    Товары хранятся по id; категории хранят только списки id,
+    поэтому один товар лежит в памяти в одном экземпляре. Остаток (quantity)
+    может отставать от БД не дольше TTL.
+    """
+    def __init__(self, ttl: float = PRODUCT_CACHE_TTL, max_size: int = PRODUCT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._products = OrderedDict()    # id -> (expires_at, product)
+        self._categories = {}             # category -> (expires_at, [id, ...])
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _detach(product: Product):
+        #копия вне сессии - кэшированный объект не связан ни с одной сессией
+        return Product(**product.dict())
+
+    def _put_product(self, product: Product, expires_at: float):
+        self._products[product.id] = (expires_at, self._detach(product))
+        self._products.move_to_end(product.id)
+        while len(self._products) > self.max_size:
+            self._products.popitem(last=False)
+            self.evictions += 1
+
+    def _lookup_product(self, product_id: int, now: float):
+        entry = self._products.get(product_id)
+        if entry is None or entry[0] < now:
+            return None
+        self._products.move_to_end(product_id)
+        return entry[1]
+
+    def _lookup_ids(self, ids, now: float):
+        products = []
+        for product_id in ids:
+            product = self._lookup_product(product_id, now)
+            if product is None:
+                return None
+            products.append(product)
+        return products
+
+    def _record(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get_product(self, product_id: int):
+        with self._lock:
+            return self._record(self._lookup_product(product_id, time.monotonic()))
+
+    def put_product(self, product: Product):
+        with self._lock:
+            self._put_product(product, time.monotonic() + self.ttl)
+
+    def get_category(self, category: str):
+        with self._lock:
+            now = time.monotonic()
+            entry = self._categories.get(category)
+            products = None
+            if entry is not None and entry[0] >= now:
+                products = self._lookup_ids(entry[1], now)
+            return self._record(products)
+
+    def put_category(self, category: str, products):
+        with self._lock:
+            expires_at = time.monotonic() + self.ttl
+            for product in products:
+                self._put_product(product, expires_at)
+            self._categories[category] = (expires_at, [product.id for product in products])
+
+    def invalidate_product(self, product_id=None, category=None):
+        """Сброс после записи: сам товар и его категория"""
+        with self._lock:
+            if product_id is not None:
+                self._products.pop(product_id, None)
+            self._categories.pop(category, None)
+
+    def clear(self):
+        with self._lock:
+            self._products.clear()
+            self._categories.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "products": len(self._products),
+                "categories": len(self._categories),
+                "ttl_seconds": self.ttl,
+                "max_size": self.max_size
+            }
+
+product_cache = ProductCache()
@@ -0,0 +1,114 @@
+import argparse
+import sys
+from contextlib import contextmanager
+from sqlalchemy import event, text
+from sqlmodel import Session
+from cache import product_cache
+from models import Product
+from requests import (
+    PRODUCT_COLUMNS, rows_statement, get_order_item_rows, get_all_customers, get_all_orders,
+    get_products_by_category, get_orders_by_status, get_cashiers_by_shift, get_order_items_by_order_id,
+    get_customer_by_id, get_product_by_id, get_order_by_id, get_cashier_by_id,
+    get_expiring_products, get_low_stock_products
+)
+
+#узлы плана, означающие чтение через индекс
+INDEX_NODE_TYPES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+
+#функции чтения из requests.py и аргументы для них (из образца данных)
+CHECKS = [
+    ("get_order_items_by_order_id", lambda session, sample: get_order_items_by_order_id(session, sample["order_id"])),
+    ("get_orders_by_status", lambda session, sample: get_orders_by_status(session, "new")),
+    ("get_products_by_category", lambda session, sample: get_products_by_category(session, sample["category"])),
+    ("get_cashiers_by_shift", lambda session, sample: get_cashiers_by_shift(session, sample["shift"])),
+    ("get_customer_by_id", lambda session, sample: get_customer_by_id(session, sample["customer_id"])),
+    ("get_product_by_id", lambda session, sample: get_product_by_id(session, sample["product_id"])),
+    ("get_order_by_id", lambda session, sample: get_order_by_id(session, sample["order_id"])),
+    ("get_cashier_by_id", lambda session, sample: get_cashier_by_id(session, sample["cashier_id"])),
+    ("get_all_customers", lambda session, sample: get_all_customers(session, 100, sample["customer_id"])),
+    #GET /products читает те же колонки асинхронно (get_product_rows_async)
+    ("get_product_rows", lambda session, sample: session.execute(
+        rows_statement(Product, PRODUCT_COLUMNS, 100, sample["product_id"])).all()),
+    ("get_all_orders", lambda session, sample: get_all_orders(session, 100, sample["order_id"])),
+    ("get_order_item_rows", lambda session, sample: get_order_item_rows(session, 100, sample["order_item_id"])),
+    ("get_expiring_products", lambda session, sample: get_expiring_products(session, 7)),
+    ("get_low_stock_products", lambda session, sample: get_low_stock_products(session, 10))
+]
+
+@contextmanager
+def capture_statements(engine):
+    """Перехват SQL, который функция отправляет в БД"""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+def plan_node_types(plan):
+    """Все типы узлов плана EXPLAIN (FORMAT JSON)"""
+    types = [plan["Node Type"]]
+    for child in plan.get("Plans", []):
+        types.extend(plan_node_types(child))
+    return types
+
+def load_sample(session: Session):
+    """Значения для проверок: середина диапазонов id и самые редкие категория и смена"""
+    sample = {}
+    for key, table in (("customer_id", "customers"), ("product_id", "products"), ("order_id", "orders"),
+                       ("order_item_id", "order_items"), ("cashier_id", "cashiers")):
+        sample[key] = session.execute(text(
+            f'SELECT (MIN(id) + MAX(id)) / 2 FROM "Demyanenko".{table}'
+        )).scalar_one()
+    sample["category"] = session.execute(text(
+        'SELECT category FROM "Demyanenko".products GROUP BY category ORDER BY COUNT(*) LIMIT 1'
+    )).scalar_one()
+    sample["shift"] = session.execute(text(
+        'SELECT shift FROM "Demyanenko".cashiers GROUP BY shift ORDER BY COUNT(*) LIMIT 1'
+    )).scalar_one()
+    return sample
+
+def check_index_usage(engine):
+    """EXPLAIN каждого запроса из CHECKS; возвращает [(функция, узлы плана, использует индекс)]"""
+    results = []
+    with Session(engine) as session:
+        sample = load_sample(session)
+        for name, call in CHECKS:
+            #кэш каталога не должен скрывать запрос к БД
+            product_cache.clear()
+            with capture_statements(engine) as captured:
+                call(session, sample)
+            node_types = []
+            with engine.connect() as connection:
+                for statement, parameters in captured:
+                    plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar_one()
+                    node_types.extend(plan_node_types(plan[0]["Plan"]))
+            uses_index = bool(captured) and bool(INDEX_NODE_TYPES.intersection(node_types))
+            results.append((name, node_types, uses_index))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка, что запросы из requests.py используют индексы")
+    parser.add_argument("--seed", action="store_true", help="сначала заполнить БД тестовыми данными (seed.py)")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель объёма данных для --seed")
+    args = parser.parse_args()
+
+    from database import get_engine
+    from migrate import apply_migrations
+    from seed import seed_large_dataset
+
+    engine = get_engine()
+    apply_migrations(engine)
+    if args.seed:
+        with Session(engine) as session:
+            seed_large_dataset(session, args.scale)
+
+    failed = 0
+    for name, node_types, uses_index in check_index_usage(engine):
+        print(f"{'OK  ' if uses_index else 'FAIL'} {name}: {', '.join(node_types)}")
+        failed += not uses_index
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+
+#время хранения ответа по ключу, секунды
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+#через сколько секунд незавершённый запрос считается брошенным и ключ можно занять заново
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+#число ответов в кэше процесса перед таблицей idempotency_keys
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+#как часто удалять просроченные ключи из таблицы, секунды
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", "300"))
+#наибольшее тело запроса с ключом, байты: тело читается в память целиком, чтобы посчитать отпечаток
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", str(1024 * 1024)))
+
+MAX_KEY_LENGTH = 200
+#записи касс, которые повторяются при обрыве связи; загрузки CSV и остальные запросы идут мимо
+IDEMPOTENT_ROUTES = {
+    ("POST", "/orders"),
+    ("POST", "/orders/basket"),
+    ("POST", "/order-items"),
+    ("POST", "/order-items/scan"),
+    ("POST", "/returns")
+}
+
+logger = logging.getLogger("minimarket.idempotency")
+
+class StoredResponse:
+    """Ответ, сохранённый по ключу; status_code None - запрос ещё выполняется"""
+    def __init__(self, fingerprint: str, status_code=None, content_type=None, body=b""):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.content_type = content_type
+        self.body = body
+
+class ResponseCache:
+    """Завершённые ответы в памяти процесса: TTL + LRU, повтор не обращается к БД"""
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_size: int = IDEMPOTENCY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._responses = OrderedDict()    # key -> (expires_at, StoredResponse)
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._responses.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._responses[key]
+                return None
+            self._responses.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, response: StoredResponse):
+        with self._lock:
+            self._responses[key] = (time.monotonic() + self.ttl, response)
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_size:
+                self._responses.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._responses.clear()
+
+class IdempotencyStore:
+    """Таблица idempotency_keys: ключ занимается до выполнения запроса одной командой INSERT ... ON CONFLICT,
+    поэтому из двух одновременных повторов выполняется только один"""
+    def __init__(self, get_engine, ttl: float = IDEMPOTENCY_TTL, lock_seconds: float = IDEMPOTENCY_LOCK_SECONDS):
+        #движок берётся при первом запросе с ключом, а не при создании приложения
+        self.get_engine = get_engine
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self._last_purge = time.monotonic()
+
+    async def claim(self, key: str, fingerprint: str):
+        """None - ключ занят этим запросом, иначе сохранённый (или выполняющийся) ответ"""
+        async with self.get_engine().begin() as connection:
+            claimed = (await connection.execute(text("""
+                INSERT INTO "Demyanenko".idempotency_keys (key, fingerprint, expires_at)
+                VALUES (:key, :fingerprint, now() + make_interval(secs => :ttl))
+                ON CONFLICT (key) DO UPDATE
+                SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, content_type = NULL, body = NULL,
+                    created_at = now(), expires_at = EXCLUDED.expires_at
+                WHERE idempotency_keys.expires_at < now()
+                   OR (idempotency_keys.status_code IS NULL
+                       AND idempotency_keys.created_at < now() - make_interval(secs => :lock_seconds))
+                RETURNING key
+            """), {"key": key, "fingerprint": fingerprint, "ttl": self.ttl,
+                   "lock_seconds": self.lock_seconds})).first()
+            if claimed is not None:
+                return None
+            row = (await connection.execute(text("""
+                SELECT fingerprint, status_code, content_type, body
+                FROM "Demyanenko".idempotency_keys WHERE key = :key
+            """), {"key": key})).first()
+        if row is None:
+            #ключ только что освобождён другим запросом - считаем, что он ещё выполняется
+            return StoredResponse(fingerprint)
+        return StoredResponse(row.fingerprint, row.status_code, row.content_type, bytes(row.body or b""))
+
+    async def complete(self, key: str, fingerprint: str, response: StoredResponse):
+        async with self.get_engine().begin() as connection:
+            await connection.execute(text("""
+                UPDATE "Demyanenko".idempotency_keys
+                SET status_code = :status_code, content_type = :content_type, body = :body
+                WHERE key = :key AND fingerprint = :fingerprint AND status_code IS NULL
+            """), {"key": key, "fingerprint": fingerprint, "status_code": response.status_code,
+                   "content_type": response.content_type, "body": response.body})
+
+    async def release(self, key: str, fingerprint: str):
+        """Запрос завершился ошибкой сервера - ключ освобождается для повтора"""
+        async with self.get_engine().begin() as connection:
+            await connection.execute(text("""
+                DELETE FROM "Demyanenko".idempotency_keys
+                WHERE key = :key AND fingerprint = :fingerprint AND status_code IS NULL
+            """), {"key": key, "fingerprint": fingerprint})
+
+    async def purge_expired(self):
+        """Удаление просроченных ключей, не чаще раза в IDEMPOTENCY_PURGE_INTERVAL секунд"""
+        now = time.monotonic()
+        if now - self._last_purge < IDEMPOTENCY_PURGE_INTERVAL:
+            return 0
+        self._last_purge = now
+        async with self.get_engine().begin() as connection:
+            result = await connection.execute(text(
+                'DELETE FROM "Demyanenko".idempotency_keys WHERE expires_at < now()'
+            ))
+        return result.rowcount
+
+def request_fingerprint(scope, body: bytes):
+    """Хэш метода, пути, параметров и тела: тот же ключ с другим запросом - ошибка клиента"""
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+async def send_response(send, status_code: int, body: bytes, content_type: str = "application/json", headers=()):
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()),
+                    *headers]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def send_error(send, status_code: int, detail: str):
+    await send_response(send, status_code, json.dumps({"detail": detail}, ensure_ascii=False).encode())
+
+class IdempotencyMiddleware:
+    """ASGI-middleware для заголовка Idempotency-Key на записях касс (IDEMPOTENT_ROUTES).
+    Первый запрос с ключом выполняется и его ответ сохраняется; повтор с тем же ключом и телом
+    получает сохранённый ответ с заголовком Idempotent-Replayed, пока запрос выполняется - 409.
+    Ответы 5xx не сохраняются: после них повтор выполняется заново."""
+    def __init__(self, app, get_engine, cache: ResponseCache = None, routes=IDEMPOTENT_ROUTES,
+                 max_body: int = IDEMPOTENCY_MAX_BODY):
+        self.app = app
+        self.store = IdempotencyStore(get_engine)
+        self.cache = cache if cache is not None else response_cache
+        self.routes = routes
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        key = None
+        if scope["type"] == "http" and (scope["method"], scope["path"].rstrip("/") or "/") in self.routes:
+            key = dict(scope["headers"]).get(b"idempotency-key")
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        key = key.decode("latin-1").strip()
+        if len(key) > MAX_KEY_LENGTH:
+            await send_error(send, 400, f"Idempotency-Key длиннее {MAX_KEY_LENGTH} символов")
+            return
+
+        parts = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            part = message.get("body", b"")
+            size += len(part)
+            if size > self.max_body:
+                await send_error(send, 413, f"Тело запроса с Idempotency-Key больше {self.max_body} байт")
+                return
+            parts.append(part)
+            more_body = message.get("more_body", False)
+        body = b"".join(parts)
+        fingerprint = request_fingerprint(scope, body)
+
+        stored = self.cache.get(key)
+        if stored is None:
+            stored = await self.store.claim(key, fingerprint)
+        if stored is not None:
+            await self.replay(send, stored, fingerprint)
+            return
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        response = StoredResponse(fingerprint, 500)
+        chunks = []
+
+        async def send_and_capture(message):
+            if message["type"] == "http.response.start":
+                response.status_code = message["status"]
+                headers = dict(message.get("headers", []))
+                response.content_type = headers.get(b"content-type", b"application/json").decode("latin-1")
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_and_capture)
+        finally:
+            response.body = b"".join(chunks)
+            try:
+                if response.status_code < 500:
+                    await self.store.complete(key, fingerprint, response)
+                    self.cache.put(key, response)
+                else:
+                    await self.store.release(key, fingerprint)
+                await self.store.purge_expired()
+            except Exception:
+                #ответ уже отправлен клиенту; ключ освободится через IDEMPOTENCY_LOCK_SECONDS
+                logger.exception("не удалось сохранить ответ для ключа идемпотентности")
+
+    async def replay(self, send, stored: StoredResponse, fingerprint: str):
+        if stored.fingerprint != fingerprint:
+            await send_error(send, 422, "Idempotency-Key уже использован для другого запроса")
+        elif stored.status_code is None:
+            await send_error(send, 409, "Запрос с этим Idempotency-Key ещё выполняется")
+        else:
+            await send_response(send, stored.status_code, stored.body, stored.content_type,
+                                [(b"idempotent-replayed", b"true")])
+
+response_cache = ResponseCache()
@@ -1,28 +1,118 @@
-from fastapi import FastAPI, Depends, HTTPException
+import time
+#начало импорта приложения - для отчёта о времени запуска (GET /startup)
+IMPORT_STARTED = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from typing import Optional
+from datetime import date
+import orjson
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, UploadFile, Header, Response, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlmodel import Session
-from database import get_session
-from models import (OrderCreate, OrderItemCreate, CustomerCreate, ProductCreate, CashierCreate, OrderUpdate)
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import (get_session, get_async_session, get_read_session, get_async_read_session, get_read_engine,
+                      get_engine, get_async_engine, get_replicas, init_engines, dispose_engines,
+                      warm_up_pool, warm_up_async_pool, get_pool_stats, ReadYourWritesMiddleware,
+                      create_db_and_tables, RUN_MIGRATIONS, POOL_WARMUP)
+from cache import product_cache
+from metrics import MetricsMiddleware, registry
+from idempotency import IdempotencyMiddleware
+from bulk_io import import_csv, stream_csv_export, export_sql, BulkImportError
+from stock_monitor import stock_monitor, LOW_STOCK_THRESHOLD, EXPIRY_DAYS
+from sales_rollup import sales_rollup
+from models import (Customer, Product, Order, OrderItem,
+                    OrderCreate, OrderItemCreate, CustomerCreate, ProductCreate, CashierCreate, OrderUpdate,
+                    BasketCreate, OrderItemScan, ReturnCreate)
 from requests import (
+    # постраничное и потоковое чтение
+    DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT, stream_rows,
+    # асинхронное чтение
+    get_products_by_category_async, get_product_by_id_async,
+    get_order_by_id_async, get_order_items_by_order_id_async, stream_rows_async, get_order_detail_async,
+    # быстрые списки с ETag
+    PRODUCT_COLUMNS, ORDER_ITEM_COLUMNS, get_table_version, get_table_version_async,
+    get_product_rows_async, get_order_item_rows,
+    # поиск товаров
+    search_products, MAX_SEARCH_LIMIT,
     # функции просмотра
-    get_all_customers, get_all_cashiers, get_all_suppliers,
-    get_all_products, get_all_orders, get_all_order_items,
-    get_all_returns, get_products_by_category, get_orders_by_status,
-    get_cashiers_by_shift, get_order_items_by_order_id,
+    get_all_customers, get_all_cashiers, get_all_suppliers, get_all_orders,
+    get_all_returns, get_orders_by_status, get_cashiers_by_shift,
     get_customer_by_id, get_product_by_id, get_order_by_id, get_cashier_by_id,
     # функции для операций
     create_order, create_order_item, create_customer, create_product, create_cashier,
+    create_order_with_items, create_order_item_reserved,
     update_order_status, cancel_order, complete_order, delete_order,
     delete_customer, delete_product, delete_cashier, delete_order_item,
-    recalculate_order_total
+    recalculate_order_total, create_returns, ReturnedItemsError, OrderClosedError,
+    # аналитика
+    get_revenue_by_category, get_revenue_by_product,
+    get_revenue_by_cashier, get_revenue_by_status, get_returns_rate,
+    # сроки годности и остатки
+    get_expiring_products, get_low_stock_products, get_reorder_list, get_stock_alerts
 )
 
-app = FastAPI(
-    title="Store Management API. Демьяненко Елена",
-    version="1.0.0",
-    description="Система управления магазином с автоматическим расчётом сумм заказов"
-)
+router = APIRouter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Старт: движки БД из настроек окружения, миграции, прогрев пулов, фоновая проверка остатков.
+    Остановка: фоновая проверка и соединения с БД закрываются."""
+    started = time.perf_counter()
+    engine, async_engine, replicas = init_engines()
+    if RUN_MIGRATIONS:
+        await run_in_threadpool(create_db_and_tables)
+    if POOL_WARMUP:
+        #DB_POOL_WARMUP соединений каждого пула открываются до первого запроса
+        for db_engine in [engine] + replicas.engines:
+            await run_in_threadpool(warm_up_pool, db_engine)
+        for db_engine in [async_engine] + replicas.async_engines:
+            await warm_up_async_pool(db_engine)
+    #фоновая проверка сроков и остатков (STOCK_MONITOR_INTERVAL=0 - отключена)
+    stock_monitor.start(engine)
+    #фоновое обновление сводки продаж (SALES_ROLLUP_INTERVAL=0 - отключено)
+    sales_rollup.start(engine)
+    app.state.startup_seconds = time.perf_counter() - started
+    yield
+    stock_monitor.stop()
+    sales_rollup.stop()
+    await dispose_engines()
+
+def ndjson_response(rows):
+    """Потоковый ответ NDJSON: одна строка JSON на запись, без загрузки таблицы в память"""
+    return StreamingResponse((row.json() + "\n" for row in rows), media_type="application/x-ndjson")
+
+def ndjson_response_async(rows):
+    """Потоковый ответ NDJSON из асинхронного итератора строк"""
+    return StreamingResponse((row.json() + "\n" async for row in rows), media_type="application/x-ndjson")
+
+def next_after_id(rows, limit: int):
+    """Курсор для следующей страницы (None, если страница последняя)"""
+    return rows[-1].id if len(rows) == limit else None
+
+def make_etag(table: str, version: int, *params):
+    """Слабый ETag: версия таблицы и параметры страницы"""
+    return 'W/"' + "-".join(str(part) for part in (table, version, *params)) + '"'
 
-@app.get("/")
+def etag_matches(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+
+def fast_list_response(key: str, columns, rows, limit: int, etag: str):
+    """JSON списка через orjson из кортежей колонок, минуя pydantic и jsonable_encoder"""
+    items = [dict(zip(columns, row)) for row in rows]
+    body = {key: items, "count": len(items), "next_after_id": items[-1]["id"] if len(items) == limit else None}
+    return Response(orjson.dumps(body), media_type="application/json", headers={"ETag": etag})
+
+def change_order_or_409(change, session: Session, order_id: int, *args):
+    """Изменение статуса заказа; отменённый заказ или заказ с проведёнными возвратами - 409"""
+    try:
+        return change(session, order_id, *args)
+    except (ReturnedItemsError, OrderClosedError) as error:
+        raise HTTPException(status_code=409, detail=str(error))
+
+@router.get("/")
 def read_root():
     return {
         "message": "store management api работает",
@@ -32,24 +122,28 @@ def read_root():
     }
 
 # ==================== БЛОК "ПОКУПАТЕЛИ" ====================
-@app.get("/customers")
-def read_customers(session: Session = Depends(get_session)):
-    customers = get_all_customers(session)
-    return {"customers": customers, "count": len(customers)}
+@router.get("/customers")
+def read_customers(limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT), after_id: Optional[int] = None,
+                   stream: bool = False, session: Session = Depends(get_read_session)):
+    """Список покупателей постранично (keyset по id) или потоком NDJSON при stream=true"""
+    if stream:
+        return ndjson_response(stream_rows(session, Customer))
+    customers = get_all_customers(session, limit, after_id)
+    return {"customers": customers, "count": len(customers), "next_after_id": next_after_id(customers, limit)}
 
-@app.get("/customers/{customer_id}")
-def read_customer(customer_id: int, session: Session = Depends(get_session)):
+@router.get("/customers/{customer_id}")
+def read_customer(customer_id: int, session: Session = Depends(get_read_session)):
     customer = get_customer_by_id(session, customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Покупатель не найден")
     return customer
 
-@app.post("/customers")
+@router.post("/customers")
 def create_new_customer(customer: CustomerCreate, session: Session = Depends(get_session)):
     """Создание нового клиента"""
     return create_customer(session, customer)
 
-@app.delete("/customers/{customer_id}")
+@router.delete("/customers/{customer_id}")
 def delete_customer_endpoint(customer_id: int, session: Session = Depends(get_session)):
     """Удаление покупателя"""
     success = delete_customer(session, customer_id)
@@ -58,24 +152,44 @@ def delete_customer_endpoint(customer_id: int, session: Session = Depends(get_se
     return {"message": f"Покупатель {customer_id} удален"}
 
 # ==================== БЛОК "ТОВАРЫ" ====================
-@app.get("/products")
-def read_products(session: Session = Depends(get_session)):
-    products = get_all_products(session)
-    return {"products": products, "count": len(products)}
-
-@app.get("/products/{product_id}")
-def read_product(product_id: int, session: Session = Depends(get_session)):
-    product = get_product_by_id(session, product_id)
+@router.get("/products")
+async def read_products(limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT), after_id: Optional[int] = None,
+                        stream: bool = False, if_none_match: Optional[str] = Header(None),
+                        session: AsyncSession = Depends(get_async_session)):
+    """Список товаров постранично (keyset по id) или потоком NDJSON при stream=true.
+    Если каталог не менялся, на If-None-Match отвечает 304 без чтения строк"""
+    if stream:
+        return ndjson_response_async(stream_rows_async(session, Product))
+    etag = make_etag("products", await get_table_version_async(session, "products"), limit, after_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    rows = await get_product_rows_async(session, limit, after_id)
+    return fast_list_response("products", PRODUCT_COLUMNS, rows, limit, etag)
+
+@router.get("/products/search")
+def search_products_endpoint(q: str = Query(..., min_length=1, max_length=100),
+                             mode: str = Query("prefix", pattern="^(prefix|fuzzy|fulltext)$"),
+                             limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT), offset: int = Query(0, ge=0),
+                             session: Session = Depends(get_read_session)):
+    """Поиск товаров: prefix - по началу названия, fuzzy - похожие названия, fulltext - по словам с ранжированием"""
+    rows = search_products(session, q, mode, limit, offset)
+    products = [{**product.dict(), "score": round(float(score), 4)} for product, score in rows]
+    return {"products": products, "query": q, "mode": mode, "count": len(products),
+            "next_offset": offset + limit if len(products) == limit else None}
+
+@router.get("/products/{product_id}")
+async def read_product(product_id: int, session: AsyncSession = Depends(get_async_read_session)):
+    product = await get_product_by_id_async(session, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Товар не найден")
     return product
 
-@app.post("/products")
+@router.post("/products")
 def create_new_product(product: ProductCreate, session: Session = Depends(get_session)):
     """Создание нового продукта"""
     return create_product(session, product)
 
-@app.delete("/products/{product_id}")
+@router.delete("/products/{product_id}")
 def delete_product_endpoint(product_id: int, session: Session = Depends(get_session)):
     """Удаление товара"""
     success = delete_product(session, product_id)
@@ -84,93 +198,171 @@ def delete_product_endpoint(product_id: int, session: Session = Depends(get_sess
     return {"message": f"Товар {product_id} удален"}
 
 # ==================== БЛОК "ЗАКАЗЫ" ====================
-@app.get("/orders")
-def read_orders(session: Session = Depends(get_session)):
-    orders = get_all_orders(session)
-    return {"orders": orders, "count": len(orders)}
+@router.get("/orders")
+def read_orders(limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT), after_id: Optional[int] = None,
+                stream: bool = False, session: Session = Depends(get_read_session)):
+    """Список заказов постранично (keyset по id) или потоком NDJSON при stream=true"""
+    if stream:
+        return ndjson_response(stream_rows(session, Order))
+    orders = get_all_orders(session, limit, after_id)
+    return {"orders": orders, "count": len(orders), "next_after_id": next_after_id(orders, limit)}
 
-@app.get("/orders/{order_id}")
-def read_order(order_id: int, session: Session = Depends(get_session)):
-    order = get_order_by_id(session, order_id)
+@router.get("/orders/{order_id}")
+async def read_order(order_id: int, session: AsyncSession = Depends(get_async_session)):
+    order = await get_order_by_id_async(session, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return order
 
-@app.post("/orders")
+@router.get("/orders/{order_id}/detail")
+async def read_order_detail(order_id: int, session: AsyncSession = Depends(get_async_session)):
+    """Заказ целиком для чека: позиции с названиями и ценами товаров, покупатель и кассир"""
+    order = await get_order_detail_async(session, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+    cashier = order.cashier
+    return {
+        **order.dict(),
+        "customer": order.customer,
+        "cashier": {"id": cashier.id, "full_name": cashier.full_name, "shift": cashier.shift} if cashier else None,
+        "items": [
+            {
+                **item.dict(),
+                "product_name": item.product.name if item.product else None,
+                "product_price": item.product.price if item.product else None,
+                "line_total": item.quantity * item.unit_price
+            }
+            for item in order.items
+        ],
+        "items_count": len(order.items)
+    }
+
+@router.post("/orders")
 def create_new_order(order: OrderCreate, session: Session = Depends(get_session)):
     """Создание нового заказа (сумма рассчитывается автоматически)"""
     return create_order(session, order)
 
-@app.put("/orders/{order_id}/status")
+@router.post("/orders/basket")
+def create_basket_order(basket: BasketCreate, session: Session = Depends(get_session)):
+    """Оформление заказа вместе со всеми позициями одной транзакцией"""
+    if not basket.items:
+        raise HTTPException(status_code=400, detail="Корзина пуста")
+    order, order_items = create_order_with_items(session, basket)
+    return {"order": order, "items": order_items, "item_ids": [item.id for item in order_items]}
+
+@router.put("/orders/{order_id}/status")
 def update_order_status_endpoint(order_id: int, new_status: str, session: Session = Depends(get_session)):
-    """Обновление статуса заказа"""
-    order = update_order_status(session, order_id, new_status)
+    """Обновление статуса заказа (cancelled - как отмена, с возвратом списанных позиций на склад;
+    отменённый заказ в другой статус не переводится - 409)"""
+    order = change_order_or_409(update_order_status, session, order_id, new_status)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return {"message": f"Статус заказа {order_id} изменен на '{new_status}'", "order": order}
 
-@app.put("/orders/{order_id}/cancel")
+@router.put("/orders/{order_id}/cancel")
 def cancel_order_endpoint(order_id: int, session: Session = Depends(get_session)):
-    """Отмена заказа"""
-    order = cancel_order(session, order_id)
+    """Отмена заказа (позиции, списанные со склада при сканировании, возвращаются на склад)"""
+    order = change_order_or_409(cancel_order, session, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return {"message": f"Заказ {order_id} отменен", "order": order}
 
-@app.put("/orders/{order_id}/complete")
+@router.put("/orders/{order_id}/complete")
 def complete_order_endpoint(order_id: int, session: Session = Depends(get_session)):
     """Завершение заказа"""
-    order = complete_order(session, order_id)
+    order = change_order_or_409(complete_order, session, order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return {"message": f"Заказ {order_id} завершен", "order": order}
 
-@app.delete("/orders/{order_id}")
+@router.post("/orders/{order_id}/recalculate")
+def recalculate_order_endpoint(order_id: int, session: Session = Depends(get_session)):
+    """Полный пересчёт суммы заказа по позициям за вычетом возвратов (проверка и исправление инкрементальной суммы)"""
+    order = get_order_by_id(session, order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Заказ не найден")
+    stored_total = order.total_amount
+    total = recalculate_order_total(session, order_id)
+    return {
+        "order_id": order_id,
+        "stored_total": stored_total,
+        "total_amount": total,
+        "corrected": abs(total - stored_total) > 0.005
+    }
+
+@router.delete("/orders/{order_id}")
 def delete_order_endpoint(order_id: int, session: Session = Depends(get_session)):
-    """Удаление заказа"""
+    """Удаление заказа (позиции, ещё держащие списанный остаток, возвращаются на склад)"""
     success = delete_order(session, order_id)
     if not success:
         raise HTTPException(status_code=404, detail="Заказ не найден")
     return {"message": f"Заказ {order_id} удален"}
 
 # ==================== БЛОК "ПОЗИЦИИ ЗАКАЗА" ====================
-@app.get("/order-items")
-def read_order_items(session: Session = Depends(get_session)):
-    order_items = get_all_order_items(session)
-    return {"order_items": order_items, "count": len(order_items)}
+@router.get("/order-items")
+def read_order_items(limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT), after_id: Optional[int] = None,
+                     stream: bool = False, if_none_match: Optional[str] = Header(None),
+                     session: Session = Depends(get_session)):
+    """Список позиций заказов постранично (keyset по id) или потоком NDJSON при stream=true.
+    Если позиции не менялись, на If-None-Match отвечает 304 без чтения строк"""
+    if stream:
+        return ndjson_response(stream_rows(session, OrderItem))
+    etag = make_etag("order_items", get_table_version(session, "order_items"), limit, after_id)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    rows = get_order_item_rows(session, limit, after_id)
+    return fast_list_response("order_items", ORDER_ITEM_COLUMNS, rows, limit, etag)
 
-@app.post("/order-items")
+@router.post("/order-items")
 def create_new_order_item(order_item: OrderItemCreate, session: Session = Depends(get_session)):
     """Добавление товара в заказ (сумма пересчитывается автоматически)"""
     return create_order_item(session, order_item)
 
-@app.delete("/order-items/{order_item_id}")
+@router.post("/order-items/scan")
+def scan_order_item(order_item: OrderItemScan, session: Session = Depends(get_session)):
+    """Добавление товара по цене из каталога со списанием остатка со склада (в завершённый или отменённый заказ - 409)"""
+    try:
+        db_order_item = create_order_item_reserved(session, order_item)
+    except OrderClosedError as error:
+        raise HTTPException(status_code=409, detail=str(error))
+    if not db_order_item:
+        if not get_order_by_id(session, order_item.order_id):
+            raise HTTPException(status_code=404, detail="Заказ не найден")
+        if not get_product_by_id(session, order_item.product_id):
+            raise HTTPException(status_code=404, detail="Товар не найден")
+        raise HTTPException(status_code=409, detail="Недостаточно товара на складе")
+    return db_order_item
+
+@router.delete("/order-items/{order_item_id}")
 def delete_order_item_endpoint(order_item_id: int, session: Session = Depends(get_session)):
-    """Удаление товара из заказа (сумма пересчитывается автоматически)"""
-    success = delete_order_item(session, order_item_id)
+    """Удаление товара из заказа (сумма пересчитывается автоматически, списанный остаток возвращается на склад)"""
+    try:
+        success = delete_order_item(session, order_item_id)
+    except ReturnedItemsError as error:
+        raise HTTPException(status_code=409, detail=str(error))
     if not success:
         raise HTTPException(status_code=404, detail="Позиция заказа не найдена")
     return {"message": f"Товар {order_item_id} удален из заказа"}
 
 # ==================== БЛОК "КАССИРЫ" ====================
-@app.get("/cashiers")
-def read_cashiers(session: Session = Depends(get_session)):
+@router.get("/cashiers")
+def read_cashiers(session: Session = Depends(get_read_session)):
     cashiers = get_all_cashiers(session)
     return {"cashiers": cashiers, "count": len(cashiers)}
 
-@app.get("/cashiers/{cashier_id}")
-def read_cashier(cashier_id: int, session: Session = Depends(get_session)):
+@router.get("/cashiers/{cashier_id}")
+def read_cashier(cashier_id: int, session: Session = Depends(get_read_session)):
     cashier = get_cashier_by_id(session, cashier_id)
     if not cashier:
         raise HTTPException(status_code=404, detail="Кассир не найден")
     return cashier
 
-@app.post("/cashiers")
+@router.post("/cashiers")
 def create_new_cashier(cashier: CashierCreate, session: Session = Depends(get_session)):
     """Создание нового кассира"""
     return create_cashier(session, cashier)
 
-@app.delete("/cashiers/{cashier_id}")
+@router.delete("/cashiers/{cashier_id}")
 def delete_cashier_endpoint(cashier_id: int, session: Session = Depends(get_session)):
     """Удаление кассира"""
     success = delete_cashier(session, cashier_id)
@@ -179,38 +371,199 @@ def delete_cashier_endpoint(cashier_id: int, session: Session = Depends(get_sess
     return {"message": f"Кассир {cashier_id} удален"}
 
 # ==================== ФИЛЬТРЫ И СПЕЦИАЛЬНЫЕ ЗАПРОСЫ ====================
-@app.get("/products/category/{category}")
-def read_products_by_category(category: str, session: Session = Depends(get_session)):
-    products = get_products_by_category(session, category)
+@router.get("/products/category/{category}")
+async def read_products_by_category(category: str, session: AsyncSession = Depends(get_async_read_session)):
+    products = await get_products_by_category_async(session, category)
     return {"products": products, "category": category, "count": len(products)}
 
-@app.get("/orders/status/{status}")
-def read_orders_by_status(status: str, session: Session = Depends(get_session)):
+@router.get("/orders/status/{status}")
+def read_orders_by_status(status: str, session: Session = Depends(get_read_session)):
     orders = get_orders_by_status(session, status)
     return {"orders": orders, "status": status, "count": len(orders)}
 
-@app.get("/cashiers/shift/{shift}")
-def read_cashiers_by_shift(shift: str, session: Session = Depends(get_session)):
+@router.get("/cashiers/shift/{shift}")
+def read_cashiers_by_shift(shift: str, session: Session = Depends(get_read_session)):
     cashiers = get_cashiers_by_shift(session, shift)
     return {"cashiers": cashiers, "shift": shift, "count": len(cashiers)}
 
-@app.get("/orders/{order_id}/items")
-def read_order_items_by_order(order_id: int, session: Session = Depends(get_session)):
-    order_items = get_order_items_by_order_id(session, order_id)
+@router.get("/orders/{order_id}/items")
+async def read_order_items_by_order(order_id: int, session: AsyncSession = Depends(get_async_session)):
+    order_items = await get_order_items_by_order_id_async(session, order_id)
     return {"order_id": order_id, "items": order_items, "count": len(order_items)}
 
 # ==================== ДОПОЛНИТЕЛЬНЫЕ СУЩНОСТИ ====================
-@app.get("/suppliers")
-def read_suppliers(session: Session = Depends(get_session)):
+@router.get("/suppliers")
+def read_suppliers(session: Session = Depends(get_read_session)):
     suppliers = get_all_suppliers(session)
     return {"suppliers": suppliers, "count": len(suppliers)}
 
-@app.get("/returns")
-def read_returns(session: Session = Depends(get_session)):
+@router.post("/returns")
+def create_returns_endpoint(returns: ReturnCreate, session: Session = Depends(get_session)):
+    """Проведение возвратов пачкой строк (один заказ или все возвраты за день): товар возвращается на склад,
+    суммы заказов уменьшаются. Если хоть одна строка превышает проданное количество, не проводится ничего"""
+    if not returns.lines:
+        raise HTTPException(status_code=400, detail="Нет строк возврата")
+    result, rejected = create_returns(session, returns)
+    if rejected:
+        raise HTTPException(status_code=409, detail={"message": "Возврат не проведён", "rejected": rejected})
+    return result
+
+@router.get("/returns")
+def read_returns(session: Session = Depends(get_read_session)):
     returns = get_all_returns(session)
     return {"returns": returns, "count": len(returns)}
 
-@app.get("/info")
+# ==================== БЛОК "АНАЛИТИКА" ====================
+@router.post("/analytics/refresh")
+def refresh_analytics(full: bool = False, session: Session = Depends(get_session)):
+    """Внеочередное обновление дневной сводки продаж (full=true - полная пересборка)"""
+    return sales_rollup.run_once(session, full)
+
+@router.get("/analytics/rollup")
+def read_rollup_status():
+    """Состояние фонового обновления сводки продаж"""
+    return sales_rollup.status()
+
+@router.get("/analytics/revenue/category")
+def read_revenue_by_category(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                             session: Session = Depends(get_read_session)):
+    """Выручка по категориям товаров"""
+    rows = get_revenue_by_category(session, date_from, date_to)
+    return {"revenue": rows, "date_from": date_from, "date_to": date_to}
+
+@router.get("/analytics/revenue/product")
+def read_revenue_by_product(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                            limit: int = Query(20, ge=1, le=MAX_PAGE_LIMIT), session: Session = Depends(get_read_session)):
+    """Самые продаваемые товары по выручке"""
+    rows = get_revenue_by_product(session, date_from, date_to, limit)
+    return {"revenue": rows, "date_from": date_from, "date_to": date_to}
+
+@router.get("/analytics/revenue/cashier")
+def read_revenue_by_cashier(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                            session: Session = Depends(get_read_session)):
+    """Выручка по кассирам"""
+    rows = get_revenue_by_cashier(session, date_from, date_to)
+    return {"revenue": rows, "date_from": date_from, "date_to": date_to}
+
+@router.get("/analytics/revenue/status")
+def read_revenue_by_status(session: Session = Depends(get_read_session)):
+    """Число заказов и выручка по статусам"""
+    return {"revenue": get_revenue_by_status(session)}
+
+@router.get("/analytics/returns-rate")
+def read_returns_rate(session: Session = Depends(get_read_session)):
+    """Доля возвратов от выручки"""
+    return get_returns_rate(session)
+
+# ==================== БЛОК "СРОКИ И ОСТАТКИ" ====================
+@router.get("/stock/expiring")
+def read_expiring_products(days: int = Query(EXPIRY_DAYS, ge=0, le=365), limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+                           session: Session = Depends(get_read_session)):
+    """Товары, у которых срок годности истекает в ближайшие days дней (и уже просроченные)"""
+    return get_expiring_products(session, days, limit)
+
+@router.get("/stock/low")
+def read_low_stock_products(threshold: int = Query(LOW_STOCK_THRESHOLD, ge=1), limit: int = Query(DEFAULT_PAGE_LIMIT, ge=1, le=MAX_PAGE_LIMIT),
+                            session: Session = Depends(get_read_session)):
+    """Товары с остатком ниже порога"""
+    return get_low_stock_products(session, threshold, limit)
+
+@router.get("/stock/reorder")
+def read_reorder_list(threshold: int = Query(LOW_STOCK_THRESHOLD, ge=1), session: Session = Depends(get_read_session)):
+    """Списки дозаказа по поставщикам: товары с остатком ниже порога"""
+    return {"threshold": threshold, "suppliers": get_reorder_list(session, threshold)}
+
+@router.get("/stock/alerts")
+def read_stock_alerts(supplier_id: Optional[int] = None, session: Session = Depends(get_read_session)):
+    """Предупреждения фоновой проверки по поставщикам и состояние проверки"""
+    return {"suppliers": get_stock_alerts(session, supplier_id), "monitor": stock_monitor.status()}
+
+@router.post("/stock/alerts/refresh")
+def refresh_stock_alerts_endpoint(full: bool = False, session: Session = Depends(get_session)):
+    """Внеочередная проверка: только изменённые товары, full=true - весь каталог"""
+    return stock_monitor.run_once(session, full)
+
+# ==================== БЛОК "ЗАГРУЗКА И ВЫГРУЗКА" ====================
+@router.post("/import/{table}")
+def import_table(table: str, file: UploadFile, session: Session = Depends(get_session)):
+    """Массовая загрузка CSV (products, customers) через COPY с upsert по id"""
+    try:
+        return import_csv(session, table, file.file)
+    except BulkImportError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+@router.get("/export/{table}")
+def export_table(table: str, request: Request):
+    """Потоковая выгрузка таблицы в CSV через COPY TO STDOUT (с реплики, если она настроена)"""
+    try:
+        export_sql(table)
+    except BulkImportError as error:
+        raise HTTPException(status_code=404, detail=str(error))
+    return StreamingResponse(
+        stream_csv_export(get_read_engine(request), table),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{table}.csv"'}
+    )
+
+@router.get("/db/pool")
+def read_pool_stats():
+    """Состояние пулов соединений с БД (синхронного и асинхронного движков) и реплик для чтения"""
+    replicas = get_replicas()
+    return {
+        "sync": get_pool_stats(),
+        "async": get_pool_stats(get_async_engine()),
+        "replicas": [
+            {**status, "sync": get_pool_stats(replicas.engines[index]), "async": get_pool_stats(replicas.async_engines[index])}
+            for index, status in enumerate(replicas.status())
+        ]
+    }
+
+@router.get("/cache/products")
+def read_product_cache_stats():
+    """Счётчики попаданий и промахов кэша каталога товаров"""
+    return product_cache.stats()
+
+@router.delete("/cache/products")
+def clear_product_cache():
+    """Принудительный сброс кэша каталога"""
+    product_cache.clear()
+    return {"message": "Кэш каталога очищен"}
+
+def startup_timings(app: FastAPI):
+    """Импорт модуля приложения, старт (lifespan) и время от начала импорта до первого обработанного запроса"""
+    first_request = registry.first_request_at
+    return {
+        "import": round(IMPORT_SECONDS, 4),
+        "lifespan": round(getattr(app.state, "startup_seconds", 0.0), 4),
+        "first_request": round(first_request - IMPORT_STARTED, 4) if first_request else None
+    }
+
+@router.get("/startup")
+def read_startup_timings(request: Request):
+    """Время запуска процесса, секунды - для контроля холодного старта воркеров"""
+    return startup_timings(request.app)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def read_metrics(request: Request):
+    """Метрики эндпоинтов, SQL и пулов соединений в текстовом формате Prometheus"""
+    gauges = {"minimarket_db_pool_checked_out": [], "minimarket_db_pool_overflow": [],
+              "minimarket_db_replica_healthy": []}
+    replicas = get_replicas()
+    engines = [("sync", get_engine()), ("async", get_async_engine())]
+    for status in replicas.status():
+        index = status["replica"]
+        engines += [(f"replica{index}", replicas.engines[index]), (f"replica{index}_async", replicas.async_engines[index])]
+        gauges["minimarket_db_replica_healthy"].append(({"replica": index}, int(status["healthy"])))
+    for name, db_engine in engines:
+        stats = get_pool_stats(db_engine)
+        gauges["minimarket_db_pool_checked_out"].append(({"engine": name}, stats["checked_out"]))
+        gauges["minimarket_db_pool_overflow"].append(({"engine": name}, stats["overflow"]))
+    gauges["minimarket_startup_seconds"] = [
+        ({"phase": phase}, seconds) for phase, seconds in startup_timings(request.app).items() if seconds is not None
+    ]
+    return PlainTextResponse(registry.render_prometheus(gauges), media_type="text/plain; version=0.0.4")
+
+@router.get("/info")
 def project_info():
     return {
         "project": "Минимаркет",
@@ -224,4 +577,25 @@ def project_info():
             "Блок 'Заказы': GET/POST/PUT/DELETE /orders, управление статусами",
             "Блок 'Позиции заказа': GET/POST/DELETE /order-items"
         ]
-    }
\ No newline at end of file
+    }
+
+def create_app():
+    """Создание приложения: маршруты и middleware; подключение к БД - при старте (lifespan), а не при импорте"""
+    app = FastAPI(
+        title="Store Management API. Демьяненко Елена",
+        version="1.0.0",
+        description="Система управления магазином с автоматическим расчётом сумм заказов",
+        lifespan=lifespan
+    )
+    #повтор запроса записи с тем же Idempotency-Key получает сохранённый ответ
+    app.add_middleware(IdempotencyMiddleware, get_engine=get_async_engine)
+    #после записи клиент несколько секунд читает с основного сервера, а не с реплики
+    app.add_middleware(ReadYourWritesMiddleware)
+    #время ответа, число SQL-команд и время БД по каждому эндпоинту
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+#uvicorn main:app
+app = create_app()
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
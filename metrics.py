@@ -0,0 +1,170 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from sqlalchemy import event
+
+#запросы дольше порога пишутся в лог (миллисекунды)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+#границы корзин гистограммы длительности запросов к API, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+logger = logging.getLogger("minimarket.sql")
+
+class RequestStats:
+    """Счётчики SQL в рамках одного HTTP-запроса"""
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+
+#статистика текущего запроса; объект общий для задачи и потока threadpool, куда копируется контекст
+current_request = contextvars.ContextVar("current_request", default=None)
+
+class EndpointStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.seconds = 0.0
+        self.statements = 0
+        self.db_seconds = 0.0
+
+class MetricsRegistry:
+    """Агрегаты по эндпоинтам и SQL для экспорта в формате Prometheus"""
+    def __init__(self):
+        self.endpoints = {}
+        self.sql_statements = 0
+        self.sql_seconds = 0.0
+        self.slow_queries = 0
+        #момент завершения первого запроса (perf_counter) - время холодного старта
+        self.first_request_at = None
+        self._lock = threading.Lock()
+
+    def observe_request(self, method: str, path: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            if self.first_request_at is None:
+                self.first_request_at = time.perf_counter()
+            endpoint = self.endpoints.setdefault((method, path), EndpointStats())
+            endpoint.count += 1
+            endpoint.errors += status >= 500
+            endpoint.seconds += seconds
+            endpoint.statements += stats.statements
+            endpoint.db_seconds += stats.db_seconds
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    endpoint.buckets[index] += 1
+
+    def observe_query(self, seconds: float, slow: bool):
+        with self._lock:
+            self.sql_statements += 1
+            self.sql_seconds += seconds
+            self.slow_queries += slow
+
+    def render_prometheus(self, gauges=None):
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        lines = []
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+            lines.append("# HELP minimarket_request_duration_seconds Длительность обработки запроса к API")
+            lines.append("# TYPE minimarket_request_duration_seconds histogram")
+            for (method, path), endpoint in endpoints:
+                labels = f'method="{escape(method)}",path="{escape(path)}"'
+                for bound, count in zip(LATENCY_BUCKETS, endpoint.buckets):
+                    lines.append(f'minimarket_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'minimarket_request_duration_seconds_bucket{{{labels},le="+Inf"}} {endpoint.count}')
+                lines.append(f"minimarket_request_duration_seconds_sum{{{labels}}} {endpoint.seconds:.6f}")
+                lines.append(f"minimarket_request_duration_seconds_count{{{labels}}} {endpoint.count}")
+
+            for name, help_text, value in (
+                ("minimarket_request_errors_total", "Ответы с кодом 5xx", lambda e: e.errors),
+                ("minimarket_request_sql_statements_total", "SQL-команды, выполненные при обработке запросов",
+                 lambda e: e.statements),
+                ("minimarket_request_db_seconds_total", "Время ожидания БД при обработке запросов",
+                 lambda e: round(e.db_seconds, 6))
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (method, path), endpoint in endpoints:
+                    lines.append(f'{name}{{method="{escape(method)}",path="{escape(path)}"}} {value(endpoint)}')
+
+            for name, help_text, value in (
+                ("minimarket_sql_statements_total", "Все выполненные SQL-команды", self.sql_statements),
+                ("minimarket_sql_seconds_total", "Суммарное время SQL-команд", round(self.sql_seconds, 6)),
+                ("minimarket_slow_queries_total", f"SQL-команды дольше {SLOW_QUERY_MS:g} мс", self.slow_queries)
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name} {value}")
+
+        #gauges: {имя: [(метки, значение), ...]}
+        for name, samples in (gauges or {}).items():
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{escape(str(label))}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def escape(value: str):
+    """Экранирование значения метки Prometheus"""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+registry = MetricsRegistry()
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    registry.observe_query(seconds, slow)
+    stats = current_request.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += seconds
+    if slow:
+        logger.warning("медленный запрос %.1f мс: %s", seconds * 1000, " ".join(statement.split())[:1000])
+
+def instrument_engine(engine):
+    """Подключение счётчиков SQL к движку (для асинхронного - к его синхронной части)"""
+    target = getattr(engine, "sync_engine", engine)
+    event.listen(target, "before_cursor_execute", before_cursor_execute)
+    event.listen(target, "after_cursor_execute", after_cursor_execute)
+    return engine
+
+class MetricsMiddleware:
+    """ASGI-middleware: длительность, число SQL-команд и время БД на каждый запрос.
+    Метка path - шаблон маршрута (/orders/{order_id}), а не конкретный URL."""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = (f"app;dur={(time.perf_counter() - start) * 1000:.1f}, "
+                          f"db;dur={stats.db_seconds * 1000:.1f}")
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"x-sql-statements", str(stats.statements).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            registry.observe_request(scope["method"], path, status, time.perf_counter() - start, stats)
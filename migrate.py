@@ -0,0 +1,80 @@
+import re
+from pathlib import Path
+from sqlalchemy import text
+
+#каталог с версионными SQL-миграциями вида 001_name.sql
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+#первая строка файла, если миграцию нельзя выполнять в транзакции (CREATE INDEX CONCURRENTLY)
+NO_TRANSACTION_MARKER = "-- no-transaction"
+#ключ pg_advisory_lock, чтобы несколько воркеров не применяли миграции одновременно
+MIGRATIONS_LOCK_ID = 20250901
+
+def list_migrations(directory: Path = MIGRATIONS_DIR):
+    """Список миграций (версия, имя, путь) по возрастанию версии"""
+    migrations = []
+    for path in sorted(directory.glob("*.sql")):
+        match = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+def split_statements(sql: str):
+    """Разбиение файла на отдельные команды (для миграций вне транзакции)"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith("--")]
+    return [statement.strip() for statement in "\n".join(lines).split(";") if statement.strip()]
+
+def applied_versions(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS "Demyanenko".schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(200) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """))
+    return set(connection.execute(text('SELECT version FROM "Demyanenko".schema_migrations')).scalars())
+
+def apply_migrations(engine, directory: Path = MIGRATIONS_DIR):
+    """Применение ещё не выполненных миграций; возвращает список применённых версий"""
+    applied = []
+    with engine.connect() as lock_connection:
+        #сессионная блокировка держится, пока применяются все миграции
+        lock_connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        lock_connection.commit()
+        try:
+            with engine.begin() as connection:
+                done = applied_versions(connection)
+
+            for version, name, path in list_migrations(directory):
+                if version in done:
+                    continue
+                sql = path.read_text(encoding="utf-8")
+                if sql.startswith(NO_TRANSACTION_MARKER):
+                    with engine.connect() as connection:
+                        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+                        for statement in split_statements(sql):
+                            connection.exec_driver_sql(statement)
+                    with engine.begin() as connection:
+                        record_migration(connection, version, name)
+                else:
+                    with engine.begin() as connection:
+                        connection.exec_driver_sql(sql)
+                        record_migration(connection, version, name)
+                print(f"миграция {version:03d}_{name} применена")
+                applied.append(version)
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+            lock_connection.commit()
+    return applied
+
+def record_migration(connection, version: int, name: str):
+    connection.execute(
+        text('INSERT INTO "Demyanenko".schema_migrations (version, name) VALUES (:version, :name)'),
+        {"version": version, "name": name}
+    )
+
+if __name__ == "__main__":
+    from database import get_engine
+
+    versions = apply_migrations(get_engine())
+    if not versions:
+        print("все миграции уже применены")
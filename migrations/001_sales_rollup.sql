@@ -0,0 +1,23 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Дата оформления заказа (для дневной сводки продаж)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT now();
+
+-- Дневная сводка продаж по товарам и кассирам
+CREATE TABLE IF NOT EXISTS sales_daily (
+    day DATE NOT NULL,
+    product_id BIGINT NOT NULL,
+    cashier_id BIGINT NOT NULL,
+    quantity BIGINT NOT NULL,
+    revenue DECIMAL(14,2) NOT NULL,
+    PRIMARY KEY (day, product_id, cashier_id)
+);
+
+-- Отметки инкрементального обновления сводок
+CREATE TABLE IF NOT EXISTS rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_order_item_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP
+);
+
+INSERT INTO rollup_state (name) VALUES ('sales_daily') ON CONFLICT (name) DO NOTHING;
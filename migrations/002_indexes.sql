@@ -0,0 +1,23 @@
+-- no-transaction
+-- Индексы по внешним ключам и колонкам фильтров.
+-- CONCURRENTLY не блокирует запись в таблицы, но не может выполняться в транзакции.
+
+-- Позиции заказа: get_order_items_by_order_id, удаление/возврат по товару
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_items_order_id_idx ON "Demyanenko".order_items (order_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_items_product_id_idx ON "Demyanenko".order_items (product_id);
+
+-- Заказы: get_orders_by_status - частичный индекс только по незавершённым заказам (их мало, завершённых - большинство)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_open_status_idx ON "Demyanenko".orders (status) WHERE status <> 'completed';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_customer_id_idx ON "Demyanenko".orders (customer_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_cashier_id_idx ON "Demyanenko".orders (cashier_id);
+
+-- Товары: get_products_by_category, товары поставщика
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_category_idx ON "Demyanenko".products (category);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_supplier_id_idx ON "Demyanenko".products (supplier_id);
+
+-- Кассиры: get_cashiers_by_shift
+CREATE INDEX CONCURRENTLY IF NOT EXISTS cashiers_shift_idx ON "Demyanenko".cashiers (shift);
+
+-- Возвраты по заказу и товару
+CREATE INDEX CONCURRENTLY IF NOT EXISTS returns_order_id_idx ON "Demyanenko".returns (order_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS returns_product_id_idx ON "Demyanenko".returns (product_id);
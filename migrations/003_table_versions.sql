@@ -0,0 +1,30 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Счётчики версий таблиц для ETag: последовательности не блокируют строки,
+-- поэтому параллельные продажи не ждут друг друга на общем счётчике.
+CREATE SEQUENCE IF NOT EXISTS products_version_seq;
+CREATE SEQUENCE IF NOT EXISTS order_items_version_seq;
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM nextval(format('%I.%I', TG_TABLE_SCHEMA, TG_TABLE_NAME || '_version_seq'));
+    RETURN NULL;
+END
+$$;
+
+-- Отложенные триггеры срабатывают при commit, но nextval виден другим сессиям сразу, до того как
+-- станут видны данные - в этот промежуток можно получить 304 со старыми данными.
+-- Заменено строками версий в migrations/012_table_version_rows.sql.
+DROP TRIGGER IF EXISTS products_version ON products;
+CREATE CONSTRAINT TRIGGER products_version AFTER INSERT OR UPDATE OR DELETE ON products
+    DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_table_version();
+DROP TRIGGER IF EXISTS products_version_truncate ON products;
+CREATE TRIGGER products_version_truncate AFTER TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS order_items_version ON order_items;
+CREATE CONSTRAINT TRIGGER order_items_version AFTER INSERT OR UPDATE OR DELETE ON order_items
+    DEFERRABLE INITIALLY DEFERRED FOR EACH ROW EXECUTE FUNCTION bump_table_version();
+DROP TRIGGER IF EXISTS order_items_version_truncate ON order_items;
+CREATE TRIGGER order_items_version_truncate AFTER TRUNCATE ON order_items
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
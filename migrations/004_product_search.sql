@@ -0,0 +1,14 @@
+-- no-transaction
+-- Поиск товаров: префиксный (text_pattern_ops), нечёткий (pg_trgm) и полнотекстовый (tsvector).
+-- Выражения индексов совпадают с выражениями в search_products (requests.py).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_name_prefix_idx
+    ON "Demyanenko".products (lower(name) text_pattern_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_name_trgm_idx
+    ON "Demyanenko".products USING gin (lower(name) gin_trgm_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_search_fts_idx
+    ON "Demyanenko".products USING gin (to_tsvector('russian', name || ' ' || coalesce(category, '')));
@@ -0,0 +1,39 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Время последнего изменения товара: по нему проверка сроков и остатков
+-- обрабатывает только товары, изменённые с прошлого запуска.
+-- now() не volatile - колонка добавляется без перезаписи таблицы.
+ALTER TABLE products ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS products_touch_updated_at ON products;
+CREATE TRIGGER products_touch_updated_at BEFORE UPDATE ON products
+    FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION touch_updated_at();
+
+-- Текущие предупреждения: товары с истекающим сроком или остатком ниже порога
+CREATE TABLE IF NOT EXISTS stock_alerts (
+    product_id BIGINT PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    supplier_id BIGINT,
+    quantity INTEGER NOT NULL,
+    expiration_date DATE,
+    low_stock BOOLEAN NOT NULL,
+    expiring BOOLEAN NOT NULL,
+    detected_at TIMESTAMP NOT NULL DEFAULT now()
+);
+
+-- Отметка и параметры последнего запуска проверки
+CREATE TABLE IF NOT EXISTS stock_monitor_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_run TIMESTAMP,
+    horizon DATE,
+    low_stock_threshold INTEGER,
+    expiry_days INTEGER
+);
+
+INSERT INTO stock_monitor_state (name) VALUES ('stock_alerts') ON CONFLICT (name) DO NOTHING;
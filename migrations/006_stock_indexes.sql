@@ -0,0 +1,11 @@
+-- no-transaction
+-- Индексы для проверки сроков и остатков: диапазонные запросы вместо чтения всей таблицы.
+
+-- Истекающие товары: expiration_date <= дата горизонта
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_expiration_date_idx ON "Demyanenko".products (expiration_date);
+-- Остаток ниже порога: quantity < порог
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_quantity_idx ON "Demyanenko".products (quantity);
+-- Товары, изменённые с прошлого запуска проверки
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_updated_at_idx ON "Demyanenko".products (updated_at);
+-- Списки дозаказа по поставщику
+CREATE INDEX CONCURRENTLY IF NOT EXISTS stock_alerts_supplier_id_idx ON "Demyanenko".stock_alerts (supplier_id);
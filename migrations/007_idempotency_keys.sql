@@ -0,0 +1,17 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Ключи идемпотентности записей: повтор запроса с тем же Idempotency-Key
+-- получает сохранённый ответ, а не создаёт заказ или позицию ещё раз.
+-- status_code IS NULL - запрос с этим ключом ещё выполняется.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(200) PRIMARY KEY,
+    fingerprint CHAR(64) NOT NULL,
+    status_code INTEGER,
+    content_type VARCHAR(100),
+    body BYTEA,
+    created_at TIMESTAMP NOT NULL DEFAULT now(),
+    expires_at TIMESTAMP NOT NULL
+);
+
+-- Удаление просроченных ключей
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx ON idempotency_keys (expires_at);
@@ -0,0 +1,5 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Количество возвращённых единиц: возврат сверяется с проданным количеством позиции.
+-- Прежние возвраты - по одной единице (сумма возврата равна цене единицы).
+ALTER TABLE returns ADD COLUMN IF NOT EXISTS quantity INTEGER NOT NULL DEFAULT 1 CHECK (quantity > 0);
@@ -0,0 +1,6 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Позиция списала остаток при добавлении (/order-items/scan): при удалении позиции,
+-- отмене и удалении заказа на склад возвращаются только такие позиции.
+-- У существующих позиций признак не известен - они считаются несписанными.
+ALTER TABLE order_items ADD COLUMN IF NOT EXISTS reserved BOOLEAN NOT NULL DEFAULT false;
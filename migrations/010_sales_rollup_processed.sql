@@ -0,0 +1,10 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Позиции выше отметки rollup_state, уже учтённые в сводке sales_daily.
+-- Позиция с меньшим id может стать видна после позиций с большим (commit позже),
+-- поэтому отметка сдвигается только по позициям, обработанным достаточно давно,
+-- а более новые сверяются с этим списком и не учитываются дважды.
+CREATE TABLE IF NOT EXISTS sales_daily_processed (
+    order_item_id BIGINT PRIMARY KEY,
+    processed_at TIMESTAMP NOT NULL DEFAULT now()
+);
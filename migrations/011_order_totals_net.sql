@@ -0,0 +1,9 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Сумма заказа - стоимость позиций за вычетом возвратов (recalculate_order_total, create_returns).
+-- Возвраты, внесённые до POST /returns (Data.sql, ручной SQL), сумму заказа не уменьшали -
+-- суммы всех заказов с возвратами пересчитываются заново.
+UPDATE orders o
+SET total_amount = COALESCE((SELECT SUM(oi.quantity * oi.unit_price) FROM order_items oi WHERE oi.order_id = o.id), 0)
+                 - (SELECT SUM(r.amount_refunded) FROM returns r WHERE r.order_id = o.id)
+WHERE EXISTS (SELECT 1 FROM returns r WHERE r.order_id = o.id);
@@ -0,0 +1,54 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Версии таблиц для ETag - строки, а не последовательности: nextval виден другим сессиям сразу,
+-- до commit изменений, и клиент мог получить 304 со старыми данными. Изменение строки версии
+-- становится видно вместе с изменёнными данными. Версия таблицы - сумма её 16 строк (шардов),
+-- чтобы параллельные продажи не ждали друг друга на одной строке.
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR(50) NOT NULL,
+    shard SMALLINT NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (table_name, shard)
+);
+
+-- Начальная версия больше последнего значения последовательности - ETag, выданные раньше, не повторятся
+INSERT INTO table_versions (table_name, shard, version)
+SELECT t.table_name, s.shard, CASE WHEN s.shard = 0 THEN t.last_value + 1 ELSE 0 END
+FROM (SELECT 'products' AS table_name, last_value FROM products_version_seq
+      UNION ALL
+      SELECT 'order_items', last_value FROM order_items_version_seq) t
+CROSS JOIN generate_series(0, 15) AS s(shard)
+ON CONFLICT (table_name, shard) DO NOTHING;
+
+DROP TRIGGER IF EXISTS products_version ON products;
+DROP TRIGGER IF EXISTS products_version_truncate ON products;
+DROP TRIGGER IF EXISTS order_items_version ON order_items;
+DROP TRIGGER IF EXISTS order_items_version_truncate ON order_items;
+DROP FUNCTION IF EXISTS bump_table_version();
+DROP SEQUENCE IF EXISTS products_version_seq;
+DROP SEQUENCE IF EXISTS order_items_version_seq;
+
+-- Шард своего соединения, а если его держит другая транзакция - любой свободный.
+-- Если заняты все, транзакция ждёт шард своего соединения.
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    own_shard SMALLINT := pg_backend_pid() % 16;
+    free_shard SMALLINT;
+BEGIN
+    SELECT shard INTO free_shard FROM "Demyanenko".table_versions
+    WHERE table_name = TG_TABLE_NAME
+    ORDER BY shard = own_shard DESC, random()
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED;
+
+    UPDATE "Demyanenko".table_versions SET version = version + 1
+    WHERE table_name = TG_TABLE_NAME AND shard = COALESCE(free_shard, own_shard);
+    RETURN NULL;
+END
+$$;
+
+-- Один раз на команду, а не на каждую строку
+CREATE TRIGGER products_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+CREATE TRIGGER order_items_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON order_items
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,10 @@
+-- no-transaction
+-- Префиксный поиск: индекс по (lower(name) COLLATE "C", id) с обычным классом операторов.
+-- text_pattern_ops подходит только для LIKE, а ORDER BY lower(name), id ... LIMIT сортировал все совпадения.
+-- В правилах сортировки "C" один индекс обслуживает и LIKE 'префикс%', и ORDER BY с LIMIT без сортировки.
+-- Выражение совпадает с выражением в search_products (requests.py).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS products_name_prefix_c_idx
+    ON "Demyanenko".products ((lower(name) COLLATE "C"), id);
+
+DROP INDEX CONCURRENTLY IF EXISTS "Demyanenko".products_name_prefix_idx;
@@ -0,0 +1,8 @@
+SET LOCAL search_path TO "Demyanenko";
+
+-- Признак проведённых возвратов в строке заказа: отмена заказа (cancel_order) проверяет его
+-- по заблокированной строке одной командой. Выставляется вместе с уменьшением суммы в create_returns.
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS has_returns BOOLEAN NOT NULL DEFAULT false;
+
+UPDATE orders o SET has_returns = true
+WHERE NOT o.has_returns AND EXISTS (SELECT 1 FROM returns r WHERE r.order_id = o.id);
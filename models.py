@@ -1,6 +1,6 @@
-from sqlmodel import SQLModel, Field
-from typing import Optional
-from datetime import datetime
+from sqlmodel import SQLModel, Field, Relationship
+from typing import Optional, List
+from datetime import datetime, date
 
 # Модели таблиц (остаются без изменений)
 class Customer(SQLModel, table=True):
@@ -52,6 +52,11 @@ class Order(SQLModel, table=True):
     cashier_id: int = Field(foreign_key="Demyanenko.cashiers.id")
     total_amount: float = Field()
     status: str = Field(max_length=50)
+    
+    # связи для загрузки заказа целиком (чек) - в ответы API не попадают
+    customer: Optional["Customer"] = Relationship()
+    cashier: Optional["Cashier"] = Relationship()
+    items: List["OrderItem"] = Relationship(back_populates="order")
 
 class OrderItem(SQLModel, table=True):
     __tablename__ = "order_items"
@@ -62,6 +67,11 @@ class OrderItem(SQLModel, table=True):
     product_id: int = Field(foreign_key="Demyanenko.products.id")
     quantity: int = Field()
     unit_price: float = Field()
+    # остаток списан при добавлении (/order-items/scan) - при удалении и отмене возвращается на склад
+    reserved: bool = Field(default=False)
+    
+    order: Optional[Order] = Relationship(back_populates="items")
+    product: Optional[Product] = Relationship()
 
 class Return(SQLModel, table=True):
     __tablename__ = "returns"
@@ -71,6 +81,31 @@ class Return(SQLModel, table=True):
     order_id: int = Field(foreign_key="Demyanenko.orders.id")
     product_id: int = Field(foreign_key="Demyanenko.products.id")
     amount_refunded: float = Field()
+    quantity: int = Field(default=1)
+
+class SalesDaily(SQLModel, table=True):
+    # дневная сводка продаж, заполняется refresh_sales_rollup
+    __tablename__ = "sales_daily"
+    __table_args__ = {'schema': 'Demyanenko'}
+    
+    day: date = Field(primary_key=True)
+    product_id: int = Field(primary_key=True)
+    cashier_id: int = Field(primary_key=True)
+    quantity: int = Field()
+    revenue: float = Field()
+
+class StockAlert(SQLModel, table=True):
+    # истекающие товары и товары с малым остатком, заполняется refresh_stock_alerts
+    __tablename__ = "stock_alerts"
+    __table_args__ = {'schema': 'Demyanenko'}
+    
+    product_id: int = Field(primary_key=True, foreign_key="Demyanenko.products.id")
+    supplier_id: Optional[int] = None
+    quantity: int = Field()
+    expiration_date: Optional[date] = None
+    low_stock: bool = Field()
+    expiring: bool = Field()
+    detected_at: Optional[datetime] = None
 
 # Модели для создания - ОБНОВЛЕНО!
 class OrderCreate(SQLModel):
@@ -85,6 +120,30 @@ class OrderItemCreate(SQLModel):
     quantity: int
     unit_price: float
 
+class BasketItemCreate(SQLModel):
+    product_id: int
+    quantity: int
+    unit_price: float
+
+class BasketCreate(OrderCreate):
+    # заказ вместе со всеми позициями - создаётся одной транзакцией
+    items: List[BasketItemCreate]
+
+class OrderItemScan(SQLModel):
+    # цена берётся из каталога на сервере, остаток списывается при добавлении
+    order_id: int
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class ReturnLine(SQLModel):
+    order_id: int
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class ReturnCreate(SQLModel):
+    # пачка возвратов (один заказ или все возвраты за день) - проводится одной транзакцией
+    lines: List[ReturnLine]
+
 class OrderUpdate(SQLModel):
     status: Optional[str] = None
     total_amount: Optional[float] = None
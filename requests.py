@@ -1,33 +1,157 @@
+from typing import Optional
+from datetime import date
+from itertools import groupby
+from sqlalchemy import insert, update, delete, func, text, literal_column
+from sqlalchemy.orm import joinedload, selectinload
 from sqlmodel import select, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from cache import product_cache
 from models import (
-    Customer, Cashier, Supplier, Product, Order, OrderItem, Return,
-    OrderCreate, OrderItemCreate, OrderUpdate, CustomerCreate, ProductCreate, CashierCreate
+    Customer, Cashier, Supplier, Product, Order, OrderItem, Return, SalesDaily, StockAlert,
+    OrderCreate, OrderItemCreate, OrderUpdate, CustomerCreate, ProductCreate, CashierCreate,
+    BasketCreate, OrderItemScan, ReturnCreate
 )
 
 #ФУНКЦИИ АВТОМАТИЧЕСКОГО ПЕРЕСЧЁТА
 
 def recalculate_order_total(session: Session, order_id: int):
-    """Автоматический пересчёт суммы заказа на основе товаров"""
-    order_items = get_order_items_by_order_id(session, order_id)
-    total = 0.0
-    
-    for item in order_items:
-        total += item.quantity * item.unit_price
-    
-    #обновление суммы заказа
-    order = get_order_by_id(session, order_id)
-    if order:
-        order.total_amount = total
-        session.add(order)
-        session.commit()
-        session.refresh(order)
+    """Полный пересчёт суммы заказа (восстановление/проверка) - один UPDATE.
+    Сумма заказа - стоимость позиций за вычетом проведённых возвратов (как её меняет create_returns)"""
+    items_total = (
+        select(func.coalesce(func.sum(OrderItem.quantity * OrderItem.unit_price), 0.0))
+        .where(OrderItem.order_id == order_id)
+        .scalar_subquery()
+    )
+    refunded = (
+        select(func.coalesce(func.sum(Return.amount_refunded), 0.0))
+        .where(Return.order_id == order_id)
+        .scalar_subquery()
+    )
+    total = session.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(total_amount=items_total - refunded)
+        .returning(Order.total_amount)
+    ).scalar_one_or_none()
+    session.commit()
     
-    return total
+    return float(total) if total is not None else 0.0
+
+def apply_order_total_delta(session: Session, order_id: int, delta: float):
+    """Инкрементальное изменение суммы заказа одним UPDATE (без commit - в транзакции вызывающего)"""
+    session.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(total_amount=Order.total_amount + delta)
+    )
+
+#ФУНКЦИИ РЕЗЕРВИРОВАНИЯ ОСТАТКОВ
+
+def reserve_product_stock(session: Session, product_id: int, quantity: int):
+    """Атомарное списание остатка с возвратом цены (без commit).
+    UPDATE блокирует строку товара до конца транзакции, поэтому параллельные кассы не продадут больше, чем есть.
+    Возвращает None, если товара нет или остатка не хватает."""
+    return session.execute(
+        update(Product)
+        .where(Product.id == product_id, Product.quantity >= quantity)
+        .values(quantity=Product.quantity - quantity)
+        .returning(Product.price)
+    ).scalar_one_or_none()
+
+def release_product_stock(session: Session, product_id: int, quantity: int):
+    """Возврат остатка на склад (без commit)"""
+    session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(quantity=Product.quantity + quantity)
+    )
+
+def release_order_stock(session: Session, order_id: int):
+    """Возврат на склад позиций заказа, ещё держащих списанный остаток (reserved), одной командой (без commit).
+    reserved сбрасывается в той же команде, поэтому повторный вызов ничего не вернёт.
+    Единицы, уже вернувшиеся на склад возвратом, не возвращаются второй раз"""
+    session.execute(text("""
+        WITH released_lines AS (
+            UPDATE "Demyanenko".order_items SET reserved = false
+            WHERE order_id = :order_id AND reserved
+            RETURNING product_id, quantity
+        ),
+        returned AS (
+            SELECT product_id, SUM(quantity) AS quantity FROM "Demyanenko".returns
+            WHERE order_id = :order_id GROUP BY product_id
+        ),
+        released AS (
+            SELECT l.product_id, SUM(l.quantity) - COALESCE(MAX(r.quantity), 0) AS quantity
+            FROM released_lines l LEFT JOIN returned r ON r.product_id = l.product_id
+            GROUP BY l.product_id
+        )
+        UPDATE "Demyanenko".products p SET quantity = p.quantity + released.quantity
+        FROM released
+        WHERE p.id = released.product_id AND released.quantity > 0
+    """), {"order_id": order_id})
+
+class ReturnedItemsError(ValueError):
+    """По позициям уже проведены возвраты - удалить позицию или отменить заказ нельзя"""
+
+#заказы, в которые нельзя сканировать позиции
+CLOSED_ORDER_STATUSES = ("completed", "cancelled")
+
+class OrderClosedError(ValueError):
+    """Заказ завершён или отменён - изменить его нельзя"""
+
+#ПОСТРАНИЧНОЕ ЧТЕНИЕ
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_BATCH_SIZE = 1000
+
+def paginate(statement, model, limit: Optional[int] = None, after_id: Optional[int] = None):
+    """Keyset-пагинация по id: строки с id > after_id, не больше limit штук"""
+    statement = statement.order_by(model.id)
+    if after_id is not None:
+        statement = statement.where(model.id > after_id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    return statement
+
+def stream_rows(session: Session, model, batch_size: int = STREAM_BATCH_SIZE):
+    """Потоковое чтение таблицы через серверный курсор пачками по batch_size строк"""
+    statement = select(model).order_by(model.id).execution_options(
+        stream_results=True, yield_per=batch_size
+    )
+    for row in session.exec(statement):
+        yield row
+
+#БЫСТРОЕ ЧТЕНИЕ СПИСКОВ (кортежи явно выбранных колонок без ORM-объектов)
+
+PRODUCT_COLUMNS = ("id", "name", "category", "price", "quantity", "expiration_date", "supplier_id")
+ORDER_ITEM_COLUMNS = ("id", "order_id", "product_id", "quantity", "unit_price")
+#таблицы со счётчиком версий (migrations/012_table_version_rows.sql)
+VERSIONED_TABLES = ("products", "order_items")
+
+def table_version_statement(table: str):
+    """Версия - сумма шардов table_versions; меняется в той же транзакции, что и данные"""
+    if table not in VERSIONED_TABLES:
+        raise ValueError(f"у таблицы {table} нет счётчика версий")
+    return text(
+        'SELECT COALESCE(SUM(version), 0) FROM "Demyanenko".table_versions WHERE table_name = :table'
+    ).bindparams(table=table)
+
+def rows_statement(model, columns, limit: Optional[int], after_id: Optional[int]):
+    statement = select(*(getattr(model, column) for column in columns))
+    return paginate(statement, model, limit, after_id)
+
+def get_table_version(session: Session, table: str):
+    """Версия таблицы - растёт при каждом изменении строк (для ETag)"""
+    return session.execute(table_version_statement(table)).scalar_one()
+
+def get_order_item_rows(session: Session, limit: Optional[int] = None, after_id: Optional[int] = None):
+    return session.execute(rows_statement(OrderItem, ORDER_ITEM_COLUMNS, limit, after_id)).all()
 
 #ФУНКЦИИ ЧТЕНИЯ
 
-def get_all_customers(session: Session):
-    return session.exec(select(Customer)).all()
+def get_all_customers(session: Session, limit: Optional[int] = None, after_id: Optional[int] = None):
+    return session.exec(paginate(select(Customer), Customer, limit, after_id)).all()
 
 def get_all_cashiers(session: Session):
     return session.exec(select(Cashier)).all()
@@ -35,20 +159,18 @@ def get_all_cashiers(session: Session):
 def get_all_suppliers(session: Session):
     return session.exec(select(Supplier)).all()
 
-def get_all_products(session: Session):
-    return session.exec(select(Product)).all()
-
-def get_all_orders(session: Session):
-    return session.exec(select(Order)).all()
-
-def get_all_order_items(session: Session):
-    return session.exec(select(OrderItem)).all()
+def get_all_orders(session: Session, limit: Optional[int] = None, after_id: Optional[int] = None):
+    return session.exec(paginate(select(Order), Order, limit, after_id)).all()
 
 def get_all_returns(session: Session):
     return session.exec(select(Return)).all()
 
 def get_products_by_category(session: Session, category: str):
-    return session.exec(select(Product).where(Product.category == category)).all()
+    products = product_cache.get_category(category)
+    if products is None:
+        products = session.exec(select(Product).where(Product.category == category)).all()
+        product_cache.put_category(category, products)
+    return products
 
 def get_orders_by_status(session: Session, status: str):
     return session.exec(select(Order).where(Order.status == status)).all()
@@ -63,7 +185,12 @@ def get_customer_by_id(session: Session, customer_id: int):
     return session.exec(select(Customer).where(Customer.id == customer_id)).first()
 
 def get_product_by_id(session: Session, product_id: int):
-    return session.exec(select(Product).where(Product.id == product_id)).first()
+    product = product_cache.get_product(product_id)
+    if product is None:
+        product = session.exec(select(Product).where(Product.id == product_id)).first()
+        if product:
+            product_cache.put_product(product)
+    return product
 
 def get_order_by_id(session: Session, order_id: int):
     return session.exec(select(Order).where(Order.id == order_id)).first()
@@ -71,104 +198,692 @@ def get_order_by_id(session: Session, order_id: int):
 def get_cashier_by_id(session: Session, cashier_id: int):
     return session.exec(select(Cashier).where(Cashier.id == cashier_id)).first()
 
+#ПОИСК ТОВАРОВ (индексы - migrations/004_product_search.sql)
+
+SEARCH_MODES = ("prefix", "fuzzy", "fulltext")
+MAX_SEARCH_LIMIT = 50
+
+def escape_like(value: str):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_document():
+    #константы литералами, а не параметрами - выражение должно совпасть с выражением индекса
+    document = Product.name + literal_column("' '") + func.coalesce(Product.category, literal_column("''"))
+    return func.to_tsvector(literal_column("'russian'"), document)
+
+def search_products(session: Session, query: str, mode: str = "prefix", limit: int = 20, offset: int = 0):
+    """Поиск по названию: prefix - начало названия, fuzzy - похожие (pg_trgm), fulltext - по словам названия и категории.
+    Возвращает пары (товар, релевантность)"""
+    name = func.lower(Product.name)
+    term = query.strip().lower()
+    if mode == "prefix":
+        #COLLATE "C" - как в индексе products_name_prefix_c_idx: LIKE по префиксу и ORDER BY ... LIMIT идут по индексу
+        prefix_name = name.collate("C")
+        score = literal_column("1.0")
+        statement = select(Product, score).where(prefix_name.like(escape_like(term) + "%")).order_by(prefix_name, Product.id)
+    elif mode == "fuzzy":
+        score = func.similarity(name, term)
+        statement = select(Product, score).where(name.op("%")(term)).order_by(score.desc(), Product.id)
+    elif mode == "fulltext":
+        ts_query = func.websearch_to_tsquery(literal_column("'russian'"), query)
+        score = func.ts_rank(search_document(), ts_query)
+        statement = select(Product, score).where(search_document().op("@@")(ts_query)).order_by(score.desc(), Product.id)
+    else:
+        raise ValueError(f"неизвестный режим поиска {mode}")
+    return session.execute(statement.limit(min(limit, MAX_SEARCH_LIMIT)).offset(offset)).all()
+
+#АСИНХРОННЫЕ ФУНКЦИИ ЧТЕНИЯ (для нагруженных эндпоинтов async def)
+
+async def get_products_by_category_async(session: AsyncSession, category: str):
+    products = product_cache.get_category(category)
+    if products is None:
+        result = await session.exec(select(Product).where(Product.category == category))
+        products = result.all()
+        product_cache.put_category(category, products)
+    return products
+
+async def get_product_by_id_async(session: AsyncSession, product_id: int):
+    product = product_cache.get_product(product_id)
+    if product is None:
+        result = await session.exec(select(Product).where(Product.id == product_id))
+        product = result.first()
+        if product:
+            product_cache.put_product(product)
+    return product
+
+async def get_order_by_id_async(session: AsyncSession, order_id: int):
+    result = await session.exec(select(Order).where(Order.id == order_id))
+    return result.first()
+
+async def get_order_items_by_order_id_async(session: AsyncSession, order_id: int):
+    result = await session.exec(select(OrderItem).where(OrderItem.order_id == order_id))
+    return result.all()
+
+async def get_table_version_async(session: AsyncSession, table: str):
+    result = await session.execute(table_version_statement(table))
+    return result.scalar_one()
+
+async def get_product_rows_async(session: AsyncSession, limit: Optional[int] = None, after_id: Optional[int] = None):
+    result = await session.execute(rows_statement(Product, PRODUCT_COLUMNS, limit, after_id))
+    return result.all()
+
+async def get_order_detail_async(session: AsyncSession, order_id: int):
+    """Заказ с покупателем, кассиром и позициями с товарами - два запроса при любом размере корзины"""
+    statement = (
+        select(Order)
+        .where(Order.id == order_id)
+        .options(
+            joinedload(Order.customer),
+            joinedload(Order.cashier),
+            selectinload(Order.items).joinedload(OrderItem.product)
+        )
+    )
+    result = await session.exec(statement)
+    return result.first()
+
+async def stream_rows_async(session: AsyncSession, model, batch_size: int = STREAM_BATCH_SIZE):
+    """Асинхронное потоковое чтение таблицы через серверный курсор"""
+    statement = select(model).order_by(model.id).execution_options(yield_per=batch_size)
+    result = await session.stream_scalars(statement)
+    async for row in result:
+        yield row
+
 #ФУНКЦИИ СОЗДАНИЯ, ОБНОВЛЕНИЯ, УДАЛЕНИЯ
+#каждая запись - одна команда INSERT/UPDATE/DELETE ... RETURNING и commit, без предварительного SELECT и refresh
+
+def insert_returning(session: Session, model, values: dict):
+    """INSERT ... RETURNING * - созданная строка без отдельного refresh (без commit)"""
+    return session.scalars(insert(model).values(**values).returning(model)).one()
+
+def delete_by_id(session: Session, model, object_id: int):
+    """DELETE ... WHERE id = :id; True, если строка была удалена"""
+    result = session.execute(delete(model).where(model.id == object_id))
+    session.commit()
+    return result.rowcount > 0
 
 def create_order(session: Session, order_data: OrderCreate):
     """Создание заказа с автоматической установкой суммы = 0"""
-    db_order = Order(**order_data.dict(), total_amount=0.0)
-    session.add(db_order)
+    db_order = insert_returning(session, Order, {**order_data.dict(), "total_amount": 0.0})
     session.commit()
-    session.refresh(db_order)
     return db_order
 
-def create_order_item(session: Session, order_item_data: OrderItemCreate):
+def create_order_item(session: Session, order_item_data: OrderItemCreate, incremental: bool = True):
     """Добавление товара в заказ с автоматическим пересчётом суммы"""
-    db_order_item = OrderItem(**order_item_data.dict())
-    session.add(db_order_item)
+    db_order_item = insert_returning(session, OrderItem, order_item_data.dict())
+    
+    if incremental:
+        #позиция и изменение суммы заказа в одной транзакции
+        apply_order_total_delta(session, db_order_item.order_id, db_order_item.quantity * db_order_item.unit_price)
+        session.commit()
+    else:
+        session.commit()
+        #автоматически пересчитывание суммы заказа
+        recalculate_order_total(session, order_item_data.order_id)
+    
+    return db_order_item
+
+def create_order_with_items(session: Session, basket_data: BasketCreate):
+    """Создание заказа со всеми позициями: один многострочный INSERT, сумма считается один раз, один commit"""
+    items = [item.dict() for item in basket_data.items]
+    total = sum(item["quantity"] * item["unit_price"] for item in items)
+    
+    db_order = insert_returning(session, Order, {**basket_data.dict(exclude={"items"}), "total_amount": total})
+    db_order_items = session.scalars(
+        insert(OrderItem)
+        .values([{**item, "order_id": db_order.id} for item in items])
+        .returning(OrderItem)
+    ).all()
     session.commit()
-    session.refresh(db_order_item)
     
-    #автоматически пересчитывание суммы заказа
-    recalculate_order_total(session, order_item_data.order_id)
+    return db_order, db_order_items
+
+def create_order_item_reserved(session: Session, scan_data: OrderItemScan):
+    """Добавление товара по цене каталога со списанием остатка - одна транзакция, один commit.
+    None - заказа нет или товара не хватает; закрытый заказ - OrderClosedError"""
+    #блокировка заказа до списания: отмена того же заказа ждёт окончания транзакции (и наоборот),
+    #поэтому позиция не попадёт в уже отменённый заказ с несписанным резервом
+    status = session.execute(
+        select(Order.status).where(Order.id == scan_data.order_id).with_for_update()
+    ).scalar_one_or_none()
+    if status in CLOSED_ORDER_STATUSES:
+        session.rollback()
+        raise OrderClosedError(f"заказ {scan_data.order_id} закрыт (статус {status})")
+    unit_price = None
+    if status is not None:
+        unit_price = reserve_product_stock(session, scan_data.product_id, scan_data.quantity)
+    if unit_price is None:
+        #UPDATE не изменил ни одной строки - завершаем пустую транзакцию
+        session.commit()
+        return None
+    
+    db_order_item = insert_returning(session, OrderItem, {**scan_data.dict(), "unit_price": unit_price, "reserved": True})
+    apply_order_total_delta(session, db_order_item.order_id, db_order_item.quantity * db_order_item.unit_price)
+    session.commit()
     
     return db_order_item
 
-def delete_order_item(session: Session, order_item_id: int):
-    """Удаление товара из заказа с пересчётом суммы"""
-    order_item = session.exec(select(OrderItem).where(OrderItem.id == order_item_id)).first()
-    if order_item:
-        order_id = order_item.order_id
-        session.delete(order_item)
+def delete_order_item(session: Session, order_item_id: int, incremental: bool = True):
+    """Удаление товара из заказа с пересчётом суммы; списанный при добавлении остаток возвращается на склад"""
+    #блокировка заказа позиции: отмена и удаление того же заказа ждут окончания транзакции
+    order_status = session.execute(
+        select(Order.status)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(OrderItem.id == order_item_id)
+        .with_for_update(of=Order)
+    ).scalar_one_or_none()
+    if order_status is not None:
+        returned = session.execute(
+            select(Return.id)
+            .join(OrderItem, (OrderItem.order_id == Return.order_id) & (OrderItem.product_id == Return.product_id))
+            .where(OrderItem.id == order_item_id)
+            .limit(1)
+        ).first()
+        if returned:
+            session.rollback()
+            raise ReturnedItemsError(f"по позиции {order_item_id} уже проведён возврат")
+    order_item = None
+    if order_status is not None:
+        order_item = session.execute(
+            delete(OrderItem)
+            .where(OrderItem.id == order_item_id)
+            .returning(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity, OrderItem.unit_price,
+                       OrderItem.reserved)
+        ).first()
+    if not order_item:
+        session.commit()
+        return False
+    
+    #reserved сброшен, если остаток уже вернула отмена заказа
+    if order_item.reserved:
+        release_product_stock(session, order_item.product_id, order_item.quantity)
+    if incremental:
+        apply_order_total_delta(session, order_item.order_id, -order_item.quantity * order_item.unit_price)
+        session.commit()
+    else:
         session.commit()
         #пересчитывание суммы после удаления
-        recalculate_order_total(session, order_id)
-        return True
-    return False
+        recalculate_order_total(session, order_item.order_id)
+    return True
 
 def create_customer(session: Session, customer_data: CustomerCreate):
-    db_customer = Customer(**customer_data.dict())
-    session.add(db_customer)
+    db_customer = insert_returning(session, Customer, customer_data.dict())
     session.commit()
-    session.refresh(db_customer)
     return db_customer
 
 def create_product(session: Session, product_data: ProductCreate):
-    db_product = Product(**product_data.dict())
-    session.add(db_product)
+    db_product = insert_returning(session, Product, product_data.dict())
     session.commit()
-    session.refresh(db_product)
+    product_cache.invalidate_product(db_product.id, db_product.category)
     return db_product
 
 def create_cashier(session: Session, cashier_data: CashierCreate):
-    db_cashier = Cashier(**cashier_data.dict())
-    session.add(db_cashier)
+    db_cashier = insert_returning(session, Cashier, cashier_data.dict())
     session.commit()
-    session.refresh(db_cashier)
     return db_cashier
 
 def update_order_status(session: Session, order_id: int, new_status: str):
-    db_order = get_order_by_id(session, order_id)
-    if db_order:
-        db_order.status = new_status
-        session.add(db_order)
-        session.commit()
-        session.refresh(db_order)
+    """UPDATE ... RETURNING: None, если заказа нет.
+    cancelled - через cancel_order; отменённый заказ из статуса cancelled не выводится (OrderClosedError)"""
+    if new_status == "cancelled":
+        return cancel_order(session, order_id)
+    db_order = session.scalars(
+        update(Order)
+        .where(Order.id == order_id, Order.status != "cancelled")
+        .values(status=new_status)
+        .returning(Order)
+    ).first()
+    session.commit()
+    if db_order is None and get_order_by_id(session, order_id) is not None:
+        #остатки отменённого заказа уже возвращены на склад
+        raise OrderClosedError(f"заказ {order_id} отменён")
     return db_order
 
 def cancel_order(session: Session, order_id: int):
-    return update_order_status(session, order_id, "cancelled")
+    """Отмена заказа одной командой: блокировка заказа, проверка возвратов, смена статуса
+    и возврат на склад позиций, списанных при сканировании (reserved сбрасывается).
+    Заказ, по которому проведены возвраты, не отменяется (ReturnedItemsError); None, если заказа нет"""
+    #FOR UPDATE отдаёт последнюю версию строки заказа, поэтому возврат, проведённый пока отмена ждала
+    #блокировку, виден по orders.has_returns. Позиции читаются по снимку начала команды: если заказ
+    #менялся параллельно (xmin снимка и заблокированной строки различаются), позиции, отсканированные
+    #за это время, возвращаются на склад второй командой
+    row = session.execute(text("""
+        WITH snapshot AS (
+            SELECT xmin FROM "Demyanenko".orders WHERE id = :order_id
+        ),
+        locked AS (
+            SELECT id, customer_id, cashier_id, total_amount, status, has_returns, xmin
+            FROM "Demyanenko".orders WHERE id = :order_id
+            FOR UPDATE
+        ),
+        cancelled AS (
+            UPDATE "Demyanenko".orders o SET status = 'cancelled'
+            FROM locked l
+            WHERE o.id = l.id AND l.status <> 'cancelled' AND NOT l.has_returns
+            RETURNING o.id
+        ),
+        released_lines AS (
+            UPDATE "Demyanenko".order_items oi SET reserved = false
+            FROM cancelled c
+            WHERE oi.order_id = c.id AND oi.reserved
+            RETURNING oi.product_id, oi.quantity
+        ),
+        restocked AS (
+            UPDATE "Demyanenko".products p SET quantity = p.quantity + r.quantity
+            FROM (SELECT product_id, SUM(quantity) AS quantity FROM released_lines GROUP BY product_id) r
+            WHERE p.id = r.product_id
+            RETURNING p.id
+        )
+        SELECT l.id, l.customer_id, l.cashier_id, l.total_amount,
+               CASE WHEN c.id IS NULL THEN l.status ELSE 'cancelled' END AS status,
+               l.has_returns AND l.status <> 'cancelled' AS has_returns,
+               c.id IS NOT NULL AND l.xmin::text <> (SELECT xmin::text FROM snapshot) AS concurrent
+        FROM locked l LEFT JOIN cancelled c ON c.id = l.id
+    """), {"order_id": order_id}).mappings().one_or_none()
+    if row is None:
+        session.commit()
+        return None
+    if row["has_returns"]:
+        session.rollback()
+        raise ReturnedItemsError(f"по заказу {order_id} уже проведены возвраты")
+    if row["concurrent"]:
+        release_order_stock(session, order_id)
+    session.commit()
+    return Order(
+        id=row["id"], customer_id=row["customer_id"], cashier_id=row["cashier_id"],
+        total_amount=row["total_amount"], status=row["status"]
+    )
 
 def complete_order(session: Session, order_id: int):
     return update_order_status(session, order_id, "completed")
 
 def delete_order(session: Session, order_id: int):
-    db_order = get_order_by_id(session, order_id)
-    if db_order:
-        session.delete(db_order)
+    """Удаление заказа; позиции, ещё держащие списанный остаток, возвращаются на склад"""
+    status = session.execute(
+        select(Order.status).where(Order.id == order_id).with_for_update()
+    ).scalar_one_or_none()
+    if status is None:
         session.commit()
-        return True
-    return False
+        return False
+    #позиции отменённого заказа уже не держат остаток (reserved сброшен при отмене)
+    release_order_stock(session, order_id)
+    session.execute(delete(Order).where(Order.id == order_id))
+    session.commit()
+    return True
 
 def delete_customer(session: Session, customer_id: int):
-    customer = get_customer_by_id(session, customer_id)
-    if customer:
-        session.delete(customer)
-        session.commit()
-        return True
-    return False
+    return delete_by_id(session, Customer, customer_id)
 
 def delete_product(session: Session, product_id: int):
-    product = get_product_by_id(session, product_id)
-    if product:
-        session.delete(product)
-        session.commit()
-        return True
-    return False
+    category = session.execute(
+        delete(Product).where(Product.id == product_id).returning(Product.category)
+    ).first()
+    session.commit()
+    if category is None:
+        return False
+    product_cache.invalidate_product(product_id, category[0])
+    return True
 
 def delete_cashier(session: Session, cashier_id: int):
-    cashier = get_cashier_by_id(session, cashier_id)
-    if cashier:
-        session.delete(cashier)
-        session.commit()
-        return True
-    return False
\ No newline at end of file
+    return delete_by_id(session, Cashier, cashier_id)
+
+#ВОЗВРАТЫ
+
+#статусы заказов, по которым принимаются возвраты
+RETURNABLE_STATUSES = ("paid", "completed")
+#строки пачки из массивов, повторы одного товара в заказе складываются
+REQUESTED_LINES = """
+    requested AS (
+        SELECT order_id, product_id, SUM(quantity) AS quantity
+        FROM unnest(CAST(:order_ids AS bigint[]), CAST(:product_ids AS bigint[]), CAST(:quantities AS integer[]))
+             AS line(order_id, product_id, quantity)
+        GROUP BY order_id, product_id
+    )"""
+
+def create_returns(session: Session, return_data: ReturnCreate):
+    """Проведение пачки возвратов одной транзакцией за три команды при любом числе строк:
+    блокировка заказов, проверка количества против проданного за вычетом прежних возвратов,
+    затем одна команда вставляет возвраты, возвращает товар на склад и уменьшает суммы заказов.
+    Если хотя бы одна строка не проходит проверку, не проводится ничего.
+    Возвращает (итог, отклонённые строки)."""
+    params = {
+        "order_ids": [line.order_id for line in return_data.lines],
+        "product_ids": [line.product_id for line in return_data.lines],
+        "quantities": [line.quantity for line in return_data.lines],
+        "statuses": list(RETURNABLE_STATUSES)
+    }
+    #параллельные возвраты и изменения позиций тех же заказов ждут окончания транзакции
+    session.execute(text("""
+        SELECT id FROM "Demyanenko".orders WHERE id = ANY(CAST(:order_ids AS bigint[])) ORDER BY id FOR UPDATE
+    """), params)
+    rejected = session.execute(text(f"""
+        WITH {REQUESTED_LINES},
+        sold AS (
+            SELECT oi.order_id, oi.product_id, SUM(oi.quantity) AS quantity
+            FROM "Demyanenko".order_items oi
+            JOIN requested r ON r.order_id = oi.order_id AND r.product_id = oi.product_id
+            GROUP BY oi.order_id, oi.product_id
+        ),
+        returned AS (
+            SELECT rt.order_id, rt.product_id, SUM(rt.quantity) AS quantity
+            FROM "Demyanenko".returns rt
+            JOIN requested r ON r.order_id = rt.order_id AND r.product_id = rt.product_id
+            GROUP BY rt.order_id, rt.product_id
+        )
+        SELECT r.order_id, r.product_id, r.quantity,
+               COALESCE(s.quantity, 0) - COALESCE(t.quantity, 0) AS returnable,
+               CASE WHEN o.id IS NULL THEN 'order_not_found'
+                    WHEN o.status <> ALL(CAST(:statuses AS text[])) THEN 'order_not_returnable'
+                    ELSE 'exceeds_returnable' END AS reason
+        FROM requested r
+        LEFT JOIN "Demyanenko".orders o ON o.id = r.order_id
+        LEFT JOIN sold s ON s.order_id = r.order_id AND s.product_id = r.product_id
+        LEFT JOIN returned t ON t.order_id = r.order_id AND t.product_id = r.product_id
+        WHERE o.id IS NULL OR o.status <> ALL(CAST(:statuses AS text[]))
+           OR r.quantity > COALESCE(s.quantity, 0) - COALESCE(t.quantity, 0)
+        ORDER BY r.order_id, r.product_id
+    """), params).mappings().all()
+    if rejected:
+        session.rollback()
+        return None, [dict(line) for line in rejected]
+
+    #сумма возврата - по средней цене единицы в позициях заказа.
+    #На склад возвращается не больше списанного (reserved) за вычетом прежних возвратов - позиции
+    #без списания остаток не уменьшали, а остальное вернёт release_order_stock при отмене
+    summary = session.execute(text(f"""
+        WITH {REQUESTED_LINES},
+        priced AS (
+            SELECT r.order_id, r.product_id, r.quantity,
+                   ROUND(r.quantity * SUM(oi.quantity * oi.unit_price) / SUM(oi.quantity), 2) AS amount_refunded,
+                   LEAST(r.quantity, GREATEST(
+                       COALESCE(SUM(oi.quantity) FILTER (WHERE oi.reserved), 0)
+                       - COALESCE((SELECT SUM(rt.quantity) FROM "Demyanenko".returns rt
+                                   WHERE rt.order_id = r.order_id AND rt.product_id = r.product_id), 0),
+                       0)) AS restock
+            FROM requested r
+            JOIN "Demyanenko".order_items oi ON oi.order_id = r.order_id AND oi.product_id = r.product_id
+            GROUP BY r.order_id, r.product_id, r.quantity
+        ),
+        inserted AS (
+            INSERT INTO "Demyanenko".returns (order_id, product_id, quantity, amount_refunded)
+            SELECT order_id, product_id, quantity, amount_refunded FROM priced
+            RETURNING order_id, product_id, quantity, amount_refunded
+        ),
+        restocked AS (
+            UPDATE "Demyanenko".products p SET quantity = p.quantity + i.quantity
+            FROM (SELECT product_id, SUM(restock) AS quantity FROM priced GROUP BY product_id HAVING SUM(restock) > 0) i
+            WHERE p.id = i.product_id
+            RETURNING p.id, p.category, i.quantity
+        ),
+        adjusted AS (
+            UPDATE "Demyanenko".orders o SET total_amount = o.total_amount - i.amount, has_returns = true
+            FROM (SELECT order_id, SUM(amount_refunded) AS amount FROM inserted GROUP BY order_id) i
+            WHERE o.id = i.order_id
+            RETURNING o.id, o.total_amount
+        )
+        SELECT (SELECT COUNT(*) FROM inserted) AS returns_created,
+               (SELECT COALESCE(SUM(amount_refunded), 0) FROM inserted) AS refunded,
+               (SELECT COALESCE(SUM(quantity), 0) FROM restocked) AS units_restocked,
+               (SELECT COALESCE(json_agg(json_build_array(id, category)), '[]') FROM restocked) AS products,
+               (SELECT COALESCE(json_agg(json_build_object('order_id', id, 'total_amount', total_amount) ORDER BY id),
+                                '[]') FROM adjusted) AS orders
+    """), params).one()
+    session.commit()
+
+    for product_id, category in summary.products:
+        product_cache.invalidate_product(product_id, category)
+    return {
+        "lines": len(return_data.lines),
+        "returns_created": summary.returns_created,
+        "refunded": float(summary.refunded),
+        "products_restocked": len(summary.products),
+        "units_restocked": int(summary.units_restocked),
+        "orders": summary.orders
+    }, []
+
+#ФУНКЦИИ АНАЛИТИКИ
+
+def refresh_sales_rollup(session: Session, full: bool = False, overlap_seconds: int = 60):
+    """Обновление дневной сводки продаж sales_daily.
+    id позиции выдаётся при вставке, а видна она после commit, поэтому позиция с меньшим id может
+    появиться позже уже обработанных. Позиции выше отметки (все позиции с id не больше неё уже учтены)
+    обрабатываются по списку обработанных id, а отметка сдвигается только до id, обработанных
+    раньше чем overlap_seconds назад: транзакции, начатые до них, к этому времени завершены.
+    full=True пересобирает сводку целиком (после удаления позиций или отмены заказов)."""
+    settled_id = session.execute(text(
+        'SELECT last_order_item_id FROM "Demyanenko".rollup_state WHERE name = :name FOR UPDATE'
+    ), {"name": "sales_daily"}).scalar_one()
+    from_id = settled_id
+    if full:
+        session.execute(text('DELETE FROM "Demyanenko".sales_daily'))
+        session.execute(text('DELETE FROM "Demyanenko".sales_daily_processed'))
+        from_id = 0
+    
+    #позиции не выше отметки в список не записываются - они учтены в сводке и не появятся снова
+    items, rows = session.execute(text("""
+        WITH candidates AS (
+            SELECT oi.id, oi.product_id, oi.quantity, oi.unit_price, o.created_at, o.cashier_id, o.status
+            FROM "Demyanenko".order_items oi
+            JOIN "Demyanenko".orders o ON o.id = oi.order_id
+            WHERE oi.id > :from_id
+              AND NOT EXISTS (SELECT 1 FROM "Demyanenko".sales_daily_processed p WHERE p.order_item_id = oi.id)
+        ),
+        marked AS (
+            INSERT INTO "Demyanenko".sales_daily_processed (order_item_id)
+            SELECT id FROM candidates WHERE id > :settled_id
+        ),
+        upserted AS (
+            INSERT INTO "Demyanenko".sales_daily (day, product_id, cashier_id, quantity, revenue)
+            SELECT created_at::date, product_id, cashier_id, SUM(quantity), SUM(quantity * unit_price)
+            FROM candidates
+            WHERE status <> 'cancelled'
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, product_id, cashier_id) DO UPDATE
+            SET quantity = sales_daily.quantity + EXCLUDED.quantity,
+                revenue = sales_daily.revenue + EXCLUDED.revenue
+            RETURNING 1
+        )
+        SELECT (SELECT COUNT(*) FROM candidates), (SELECT COUNT(*) FROM upserted)
+    """), {"from_id": from_id, "settled_id": settled_id}).one()
+    #now() - начало транзакции: позиции, обработанные в этом запуске, отметку не сдвигают
+    processed_to_id = session.execute(text("""
+        WITH settled AS (
+            SELECT COALESCE(MAX(order_item_id), :settled_id) AS id FROM "Demyanenko".sales_daily_processed
+            WHERE processed_at < now() - make_interval(secs => :overlap)
+        ),
+        trimmed AS (
+            DELETE FROM "Demyanenko".sales_daily_processed WHERE order_item_id <= (SELECT id FROM settled)
+        )
+        UPDATE "Demyanenko".rollup_state
+        SET last_order_item_id = GREATEST(last_order_item_id, (SELECT id FROM settled)), refreshed_at = now()
+        WHERE name = :name
+        RETURNING last_order_item_id
+    """), {"settled_id": settled_id, "overlap": overlap_seconds, "name": "sales_daily"}).scalar_one()
+    session.commit()
+    
+    return {"processed_from_id": from_id, "processed_to_id": processed_to_id, "items_processed": items,
+            "rows_upserted": rows}
+
+def filter_by_day(statement, date_from: Optional[date], date_to: Optional[date]):
+    if date_from is not None:
+        statement = statement.where(SalesDaily.day >= date_from)
+    if date_to is not None:
+        statement = statement.where(SalesDaily.day <= date_to)
+    return statement
+
+def get_revenue_by_category(session: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    revenue = func.sum(SalesDaily.revenue).label("revenue")
+    statement = (
+        select(Product.category, func.sum(SalesDaily.quantity).label("quantity"), revenue)
+        .join(Product, Product.id == SalesDaily.product_id)
+        .group_by(Product.category)
+        .order_by(revenue.desc())
+    )
+    return session.exec(filter_by_day(statement, date_from, date_to)).mappings().all()
+
+def get_revenue_by_product(session: Session, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                           limit: int = 20):
+    revenue = func.sum(SalesDaily.revenue).label("revenue")
+    statement = (
+        select(SalesDaily.product_id, Product.name, func.sum(SalesDaily.quantity).label("quantity"), revenue)
+        .join(Product, Product.id == SalesDaily.product_id)
+        .group_by(SalesDaily.product_id, Product.name)
+        .order_by(revenue.desc())
+        .limit(limit)
+    )
+    return session.exec(filter_by_day(statement, date_from, date_to)).mappings().all()
+
+def get_revenue_by_cashier(session: Session, date_from: Optional[date] = None, date_to: Optional[date] = None):
+    revenue = func.sum(SalesDaily.revenue).label("revenue")
+    statement = (
+        select(SalesDaily.cashier_id, Cashier.full_name, func.sum(SalesDaily.quantity).label("quantity"), revenue)
+        .join(Cashier, Cashier.id == SalesDaily.cashier_id)
+        .group_by(SalesDaily.cashier_id, Cashier.full_name)
+        .order_by(revenue.desc())
+    )
+    return session.exec(filter_by_day(statement, date_from, date_to)).mappings().all()
+
+def get_revenue_by_status(session: Session):
+    """Выручка по статусам заказов - по таблице orders, без чтения позиций"""
+    statement = (
+        select(Order.status, func.count(Order.id).label("orders"), func.sum(Order.total_amount).label("revenue"))
+        .group_by(Order.status)
+    )
+    return session.exec(statement).mappings().all()
+
+def get_returns_rate(session: Session):
+    """Доля возвратов: сумма возвратов к выручке по сводке (за всё время - у возвратов нет даты)"""
+    refunded, returns_count = session.exec(
+        select(func.coalesce(func.sum(Return.amount_refunded), 0.0), func.count(Return.id))
+    ).one()
+    revenue = float(session.exec(select(func.coalesce(func.sum(SalesDaily.revenue), 0.0))).one())
+    refunded = float(refunded)
+    return {
+        "revenue": revenue,
+        "refunded": refunded,
+        "returns_count": returns_count,
+        "returns_rate": round(refunded / revenue, 4) if revenue else 0.0
+    }
+
+#КОНТРОЛЬ СРОКОВ ГОДНОСТИ И ОСТАТКОВ (индексы - migrations/006_stock_indexes.sql)
+
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+DEFAULT_EXPIRY_DAYS = 7
+
+def get_expiring_products(session: Session, days: int = DEFAULT_EXPIRY_DAYS, limit: int = DEFAULT_PAGE_LIMIT):
+    """Товары со сроком годности до текущей даты + days (включая просроченные) - диапазон по индексу"""
+    statement = (
+        select(Product)
+        .where(Product.expiration_date <= func.current_date() + days)
+        .order_by(Product.expiration_date, Product.id)
+        .limit(limit)
+    )
+    return session.exec(statement).all()
+
+def get_low_stock_products(session: Session, threshold: int = DEFAULT_LOW_STOCK_THRESHOLD,
+                           limit: int = DEFAULT_PAGE_LIMIT):
+    statement = (
+        select(Product)
+        .where(Product.quantity < threshold)
+        .order_by(Product.quantity, Product.id)
+        .limit(limit)
+    )
+    return session.exec(statement).all()
+
+def group_by_supplier(rows):
+    """[(supplier_id, company_name, позиция), ...], отсортированные по поставщику -> список поставщиков с позициями"""
+    groups = []
+    for (supplier_id, company_name), items in groupby(rows, key=lambda row: (row[0], row[1])):
+        products = [item for _, _, item in items]
+        groups.append({"supplier_id": supplier_id, "company_name": company_name,
+                       "count": len(products), "products": products})
+    return groups
+
+def get_reorder_list(session: Session, threshold: int = DEFAULT_LOW_STOCK_THRESHOLD):
+    """Списки дозаказа: товары с остатком ниже порога по поставщикам, сколько докупить до порога"""
+    statement = (
+        select(Product, Supplier.company_name)
+        .outerjoin(Supplier, Supplier.id == Product.supplier_id)
+        .where(Product.quantity < threshold)
+        .order_by(Product.supplier_id.nulls_last(), Product.quantity, Product.id)
+    )
+    rows = (
+        (product.supplier_id, company_name, {**product.dict(), "reorder_quantity": threshold - product.quantity})
+        for product, company_name in session.exec(statement)
+    )
+    return group_by_supplier(rows)
+
+def refresh_stock_alerts(session: Session, threshold: int = DEFAULT_LOW_STOCK_THRESHOLD,
+                         days: int = DEFAULT_EXPIRY_DAYS, full: bool = False, overlap_seconds: int = 60):
+    """Обновление таблицы stock_alerts.
+    Инкрементально проверяются только товары, изменённые с прошлого запуска (updated_at),
+    и товары, чей срок годности попал в сдвинувшееся окно горизонта. Отметка сдвигается
+    назад на overlap_seconds, чтобы не пропустить изменения транзакций, начатых до запуска.
+    Полная проверка - при full=True, первом запуске или смене порога/горизонта."""
+    state = session.execute(text("""
+        SELECT last_run, horizon, low_stock_threshold, expiry_days
+        FROM "Demyanenko".stock_monitor_state WHERE name = :name FOR UPDATE
+    """), {"name": "stock_alerts"}).one()
+    full = full or state.last_run is None or (state.low_stock_threshold, state.expiry_days) != (threshold, days)
+
+    if full:
+        session.execute(text('DELETE FROM "Demyanenko".stock_alerts'))
+        candidates = "quantity < :threshold OR expiration_date <= current_date + :days"
+    else:
+        candidates = """updated_at > CAST(:last_run AS timestamp) - make_interval(secs => :overlap)
+            UNION
+            SELECT id, supplier_id, quantity, expiration_date FROM "Demyanenko".products
+            WHERE expiration_date > :old_horizon AND expiration_date <= current_date + :days"""
+    checked, raised, cleared = session.execute(text(f"""
+        WITH changed AS (
+            SELECT id, supplier_id, quantity, expiration_date FROM "Demyanenko".products
+            WHERE {candidates}
+        ),
+        flagged AS (
+            SELECT changed.*, quantity < :threshold AS low_stock,
+                   COALESCE(expiration_date <= current_date + :days, false) AS expiring
+            FROM changed
+        ),
+        cleared AS (
+            DELETE FROM "Demyanenko".stock_alerts a USING flagged f
+            WHERE a.product_id = f.id AND NOT (f.low_stock OR f.expiring)
+            RETURNING a.product_id
+        ),
+        raised AS (
+            INSERT INTO "Demyanenko".stock_alerts (product_id, supplier_id, quantity, expiration_date, low_stock, expiring)
+            SELECT id, supplier_id, quantity, expiration_date, low_stock, expiring FROM flagged
+            WHERE low_stock OR expiring
+            ON CONFLICT (product_id) DO UPDATE
+            SET supplier_id = EXCLUDED.supplier_id, quantity = EXCLUDED.quantity,
+                expiration_date = EXCLUDED.expiration_date,
+                low_stock = EXCLUDED.low_stock, expiring = EXCLUDED.expiring
+            RETURNING product_id
+        )
+        SELECT (SELECT COUNT(*) FROM flagged), (SELECT COUNT(*) FROM raised), (SELECT COUNT(*) FROM cleared)
+    """), {"threshold": threshold, "days": days, "last_run": state.last_run, "overlap": overlap_seconds,
+           "old_horizon": state.horizon}).one()
+    #now() - начало транзакции, т.е. момент до проверки: изменения во время проверки попадут в следующий запуск
+    horizon = session.execute(text("""
+        UPDATE "Demyanenko".stock_monitor_state
+        SET last_run = now(), horizon = current_date + :days, low_stock_threshold = :threshold, expiry_days = :days
+        WHERE name = :name
+        RETURNING horizon
+    """), {"days": days, "threshold": threshold, "name": "stock_alerts"}).scalar_one()
+    session.commit()
+
+    return {"full": full, "checked": checked, "alerts_updated": raised, "alerts_cleared": cleared, "horizon": horizon}
+
+def get_stock_alerts(session: Session, supplier_id: Optional[int] = None):
+    """Текущие предупреждения по поставщикам - из таблицы stock_alerts, без проверки всего каталога"""
+    statement = (
+        select(StockAlert, Product.name, Supplier.company_name)
+        .join(Product, Product.id == StockAlert.product_id)
+        .outerjoin(Supplier, Supplier.id == StockAlert.supplier_id)
+        .order_by(StockAlert.supplier_id.nulls_last(), StockAlert.product_id)
+    )
+    if supplier_id is not None:
+        statement = statement.where(StockAlert.supplier_id == supplier_id)
+    rows = (
+        (alert.supplier_id, company_name, {**alert.dict(), "name": name})
+        for alert, name, company_name in session.exec(statement)
+    )
+    return group_by_supplier(rows)
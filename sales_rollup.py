@@ -0,0 +1,87 @@
+import argparse
+import logging
+import os
+import threading
+import time
+from sqlmodel import Session
+from requests import refresh_sales_rollup
+
+#период фонового обновления сводки продаж, секунды (0 - обновление только по запросу)
+SALES_ROLLUP_INTERVAL = float(os.getenv("SALES_ROLLUP_INTERVAL", "300"))
+
+logger = logging.getLogger("minimarket.rollup")
+
+class SalesRollupScheduler:
+    """Периодическое инкрементальное обновление сводки sales_daily в фоновом потоке.
+    Несколько воркеров не мешают друг другу: refresh_sales_rollup блокирует строку rollup_state.
+    Полная пересборка (после отмен и удалений позиций) - отдельным ночным запуском с --full."""
+    def __init__(self, interval: float = SALES_ROLLUP_INTERVAL):
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self.last_duration = None
+        self.last_run_at = None
+        self._engine = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_once(self, session: Session, full: bool = False):
+        start = time.perf_counter()
+        result = refresh_sales_rollup(session, full)
+        with self._lock:
+            self.runs += 1
+            self.last_result = result
+            self.last_duration = round(time.perf_counter() - start, 3)
+            self.last_run_at = time.time()
+        return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with Session(self._engine) as session:
+                    self.run_once(session)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                logger.exception("обновление сводки продаж завершилось ошибкой")
+            self._stop.wait(self.interval)
+
+    def start(self, engine):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._engine = engine
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="sales-rollup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval_seconds": self.interval,
+                "runs": self.runs,
+                "failures": self.failures,
+                "last_run_at": self.last_run_at,
+                "last_duration_seconds": self.last_duration,
+                "last_result": self.last_result
+            }
+
+sales_rollup = SalesRollupScheduler()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обновление дневной сводки продаж sales_daily")
+    parser.add_argument("--full", action="store_true", help="полная пересборка (ночной запуск)")
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    with Session(get_engine()) as session:
+        print(sales_rollup.run_once(session, args.full))
@@ -0,0 +1,126 @@
+import argparse
+import time
+from sqlalchemy import text
+from sqlmodel import Session
+
+#словари для правдоподобных данных (по образцу Data.sql)
+CATEGORIES = [
+    "Выпечка", "Молочные продукты", "Фрукты", "Овощи", "Напитки", "Мясо", "Рыба",
+    "Бакалея", "Сладости", "Замороженные продукты", "Бытовая химия", "Гигиена"
+]
+PRODUCT_NAMES = [
+    "Хлеб белый", "Молоко 2.5%", "Яблоки", "Чай черный", "Сыр Российский", "Батон нарезной",
+    "Апельсины", "Кефир", "Гречка", "Сок яблочный", "Печенье", "Курица", "Пельмени", "Мыло"
+]
+SHIFTS = ["Утренняя", "Вечерняя", "Ночная"]
+
+#размеры таблиц при scale=1
+BASE_SIZES = {
+    "suppliers": 50,
+    "customers": 20000,
+    "cashiers": 200,
+    "products": 100000,
+    "orders": 50000,
+    "items_per_order": 5,
+    "returns_share": 0.01
+}
+
+def pick(array_name: str):
+    """Случайный элемент массива (SQL-выражение)"""
+    return f"{array_name}[1 + floor(random() * array_length({array_name}, 1))::int]"
+
+def pick_skewed(array_name: str):
+    """Случайный элемент с перекосом к началу массива - как реальные категории и смены"""
+    return f"{array_name}[1 + floor(power(random(), 2) * array_length({array_name}, 1))::int]"
+
+def seed_large_dataset(session: Session, scale: float = 1.0):
+    """Генерация большого набора данных на стороне сервера через generate_series.
+    Объём растёт линейно со scale: при scale=1 - 100k товаров, 50k заказов, 250k позиций."""
+    sizes = {name: int(value * scale) if name not in ("items_per_order", "returns_share") else value
+             for name, value in BASE_SIZES.items()}
+    params = {
+        "categories": CATEGORIES, "names": PRODUCT_NAMES, "shifts": SHIFTS,
+        "suppliers": max(sizes["suppliers"], 1), "customers": max(sizes["customers"], 1),
+        "cashiers": max(sizes["cashiers"], 1), "products": max(sizes["products"], 1),
+        "orders": max(sizes["orders"], 1),
+        "items": max(sizes["orders"], 1) * sizes["items_per_order"],
+        "returns": max(int(sizes["orders"] * sizes["returns_share"]), 1)
+    }
+    statements = [
+        ("suppliers", """
+            INSERT INTO "Demyanenko".suppliers (company_name, contact_info)
+            SELECT 'ООО Поставщик №' || g, 'Москва, склад ' || g FROM generate_series(1, :suppliers) g
+        """),
+        ("customers", """
+            INSERT INTO "Demyanenko".customers (first_name, last_name, phone, email)
+            SELECT 'Покупатель', 'Номер ' || g, '+79' || lpad((g % 1000000000)::text, 9, '0'), 'customer' || g || '@example.com'
+            FROM generate_series(1, :customers) g
+        """),
+        ("cashiers", f"""
+            INSERT INTO "Demyanenko".cashiers (full_name, shift, username, password)
+            SELECT 'Кассир ' || g, {pick_skewed("CAST(:shifts AS text[])")}, 'cashier_' || g || '_' || md5(random()::text), 'pass' || g
+            FROM generate_series(1, :cashiers) g
+        """),
+        ("products", f"""
+            INSERT INTO "Demyanenko".products (name, category, price, quantity, expiration_date, supplier_id)
+            SELECT {pick("CAST(:names AS text[])")} || ' ' || g, {pick_skewed("CAST(:categories AS text[])")},
+                   round((20 + random() * 980)::numeric, 2), (random() * 500)::int,
+                   current_date + (random() * 365)::int, {pick("s.ids")}
+            FROM generate_series(1, :products) g,
+                 (SELECT array_agg(id) AS ids FROM "Demyanenko".suppliers) s
+        """),
+        ("orders", f"""
+            INSERT INTO "Demyanenko".orders (customer_id, cashier_id, total_amount, status, created_at)
+            SELECT {pick("c.ids")}, {pick("k.ids")}, 0,
+                   CASE WHEN r < 0.90 THEN 'completed' WHEN r < 0.94 THEN 'paid'
+                        WHEN r < 0.98 THEN 'new' ELSE 'cancelled' END,
+                   now() - random() * interval '365 days'
+            FROM (SELECT g, random() AS r FROM generate_series(1, :orders) g) o,
+                 (SELECT array_agg(id) AS ids FROM "Demyanenko".customers) c,
+                 (SELECT array_agg(id) AS ids FROM "Demyanenko".cashiers) k
+        """),
+        ("order_items", f"""
+            INSERT INTO "Demyanenko".order_items (order_id, product_id, quantity, unit_price)
+            SELECT {pick("o.ids")}, {pick("p.ids")}, 1 + (random() * 4)::int, round((20 + random() * 980)::numeric, 2)
+            FROM generate_series(1, :items) g,
+                 (SELECT array_agg(id) AS ids FROM "Demyanenko".orders) o,
+                 (SELECT array_agg(id) AS ids FROM "Demyanenko".products) p
+        """),
+        ("returns", """
+            INSERT INTO "Demyanenko".returns (order_id, product_id, amount_refunded)
+            SELECT order_id, product_id, unit_price
+            FROM "Demyanenko".order_items TABLESAMPLE SYSTEM (1)
+            LIMIT :returns
+        """),
+        #сумма заказа - позиции за вычетом возвратов, как в recalculate_order_total
+        ("orders.total_amount", """
+            UPDATE "Demyanenko".orders o SET total_amount = t.total - COALESCE(r.refunded, 0)
+            FROM (SELECT order_id, SUM(quantity * unit_price) AS total
+                  FROM "Demyanenko".order_items GROUP BY order_id) t
+            LEFT JOIN (SELECT order_id, SUM(amount_refunded) AS refunded
+                       FROM "Demyanenko".returns GROUP BY order_id) r ON r.order_id = t.order_id
+            WHERE o.id = t.order_id
+        """)
+    ]
+    timings = {}
+    for name, sql in statements:
+        start = time.perf_counter()
+        session.execute(text(sql), params)
+        timings[name] = round(time.perf_counter() - start, 3)
+        print(f"{name}: {timings[name]} с")
+
+    #свежая статистика для планировщика
+    for table in ("suppliers", "customers", "cashiers", "products", "orders", "order_items", "returns"):
+        session.execute(text(f'ANALYZE "Demyanenko".{table}'))
+    session.commit()
+    return timings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Заполнение БД большим тестовым набором данных")
+    parser.add_argument("--scale", type=float, default=1.0, help="множитель объёма данных")
+    args = parser.parse_args()
+
+    from database import get_engine
+
+    with Session(get_engine()) as session:
+        seed_large_dataset(session, args.scale)
@@ -0,0 +1,79 @@
+import logging
+import os
+import threading
+import time
+from sqlmodel import Session
+from requests import refresh_stock_alerts, DEFAULT_LOW_STOCK_THRESHOLD, DEFAULT_EXPIRY_DAYS
+
+#период фоновой проверки сроков и остатков, секунды (0 - проверка только по запросу)
+STOCK_MONITOR_INTERVAL = float(os.getenv("STOCK_MONITOR_INTERVAL", "300"))
+LOW_STOCK_THRESHOLD = int(os.getenv("LOW_STOCK_THRESHOLD", str(DEFAULT_LOW_STOCK_THRESHOLD)))
+EXPIRY_DAYS = int(os.getenv("EXPIRY_DAYS", str(DEFAULT_EXPIRY_DAYS)))
+
+logger = logging.getLogger("minimarket.stock")
+
+class StockMonitor:
+    """Периодическое обновление предупреждений по срокам и остаткам в фоновом потоке.
+    Каждый запуск инкрементальный: проверяются только изменённые товары (refresh_stock_alerts)."""
+    def __init__(self, interval: float = STOCK_MONITOR_INTERVAL, threshold: int = LOW_STOCK_THRESHOLD,
+                 days: int = EXPIRY_DAYS):
+        self.interval = interval
+        self.threshold = threshold
+        self.days = days
+        self.runs = 0
+        self.failures = 0
+        self.last_result = None
+        self.last_duration = None
+        self._engine = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def run_once(self, session: Session, full: bool = False):
+        start = time.perf_counter()
+        result = refresh_stock_alerts(session, self.threshold, self.days, full)
+        with self._lock:
+            self.runs += 1
+            self.last_result = result
+            self.last_duration = round(time.perf_counter() - start, 3)
+        return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                with Session(self._engine) as session:
+                    self.run_once(session)
+            except Exception:
+                with self._lock:
+                    self.failures += 1
+                logger.exception("проверка сроков и остатков завершилась ошибкой")
+            self._stop.wait(self.interval)
+
+    def start(self, engine):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._engine = engine
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="stock-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval_seconds": self.interval,
+                "low_stock_threshold": self.threshold,
+                "expiry_days": self.days,
+                "runs": self.runs,
+                "failures": self.failures,
+                "last_duration_seconds": self.last_duration,
+                "last_result": self.last_result
+            }
+
+stock_monitor = StockMonitor()
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+import pytest
+
+#модули приложения лежат в корне репозитория
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+class Clock:
+    """Подменяемое time.monotonic: тесты TTL без ожидания"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr("time.monotonic", fake)
+    return fake
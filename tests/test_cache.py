@@ -0,0 +1,85 @@
+from cache import ProductCache
+from models import Product
+
+def make_product(product_id: int, category: str = "Выпечка", quantity: int = 10):
+    return Product(id=product_id, name=f"Товар {product_id}", category=category, price=50.0, quantity=quantity)
+
+def test_product_hit_and_miss_counters(clock):
+    cache = ProductCache(ttl=60)
+    assert cache.get_product(1) is None
+    cache.put_product(make_product(1))
+    assert cache.get_product(1).name == "Товар 1"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+def test_cached_product_is_a_copy(clock):
+    cache = ProductCache(ttl=60)
+    product = make_product(1)
+    cache.put_product(product)
+    product.quantity = 0
+    assert cache.get_product(1).quantity == 10
+
+def test_product_expires_after_ttl(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_product(make_product(1))
+    clock.advance(59)
+    assert cache.get_product(1) is not None
+    clock.advance(2)
+    assert cache.get_product(1) is None
+
+def test_least_recently_used_product_is_evicted(clock):
+    cache = ProductCache(ttl=60, max_size=2)
+    cache.put_product(make_product(1))
+    cache.put_product(make_product(2))
+    #чтение делает товар 1 самым свежим - вытесняется товар 2
+    cache.get_product(1)
+    cache.put_product(make_product(3))
+    assert cache.get_product(1) is not None
+    assert cache.get_product(2) is None
+    assert cache.get_product(3) is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_category_is_served_from_cached_products(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_category("Выпечка", [make_product(1), make_product(2)])
+    assert [product.id for product in cache.get_category("Выпечка")] == [1, 2]
+    #отдельный товар категории тоже берётся из кэша
+    assert cache.get_product(2) is not None
+
+def test_category_misses_when_a_member_was_evicted(clock):
+    cache = ProductCache(ttl=60, max_size=2)
+    cache.put_category("Выпечка", [make_product(1), make_product(2)])
+    cache.put_product(make_product(3, "Фрукты"))
+    assert cache.get_category("Выпечка") is None
+
+def test_category_expires_after_ttl(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_category("Выпечка", [make_product(1)])
+    clock.advance(61)
+    assert cache.get_category("Выпечка") is None
+
+def test_invalidate_product_drops_product_and_its_category(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_category("Выпечка", [make_product(1), make_product(2)])
+    cache.put_category("Фрукты", [make_product(3, "Фрукты")])
+    cache.invalidate_product(1, "Выпечка")
+    assert cache.get_product(1) is None
+    assert cache.get_category("Выпечка") is None
+    #другие товары и категории остаются
+    assert cache.get_product(2) is not None
+    assert [product.id for product in cache.get_category("Фрукты")] == [3]
+
+def test_new_product_invalidates_its_category(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_category("Выпечка", [make_product(1)])
+    #create_product сбрасывает категорию без id в кэше
+    cache.invalidate_product(2, "Выпечка")
+    assert cache.get_category("Выпечка") is None
+    assert cache.get_product(1) is not None
+
+def test_clear(clock):
+    cache = ProductCache(ttl=60)
+    cache.put_category("Выпечка", [make_product(1)])
+    cache.clear()
+    stats = cache.stats()
+    assert (stats["products"], stats["categories"]) == (0, 0)
@@ -0,0 +1,78 @@
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+import main
+from database import get_async_session, get_session
+
+ETAG = 'W/"products-42-100-None"'
+
+def test_make_etag():
+    assert main.make_etag("products", 42, 100, None) == ETAG
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"  {ETAG}  ", True),
+    ("*", True),
+    (f'W/"products-41-100-None", {ETAG}', True),
+    (f'W/"products-41-100-None",{ETAG}', True),
+    ('W/"products-41-100-None"', False),
+    #другая страница той же версии - другой ETag
+    ('W/"products-42-100-7"', False)
+])
+def test_etag_matches(header, expected):
+    assert main.etag_matches(header, ETAG) is expected
+
+@pytest.fixture
+def client(monkeypatch):
+    """Приложение без БД: версия таблицы и строки подменены, счётчик чтений строк"""
+    reads = []
+
+    async def table_version(session, table):
+        return 42
+
+    async def product_rows(session, limit, after_id):
+        reads.append((limit, after_id))
+        return [(1, "Хлеб белый", "Выпечка", 45.0, 100, None, 1)]
+
+    def order_item_rows(session, limit, after_id):
+        reads.append((limit, after_id))
+        return [(1, 1, 1, 2, 45.0)]
+
+    monkeypatch.setattr(main, "get_table_version_async", table_version)
+    monkeypatch.setattr(main, "get_product_rows_async", product_rows)
+    monkeypatch.setattr(main, "get_table_version", lambda session, table: 7)
+    monkeypatch.setattr(main, "get_order_item_rows", order_item_rows)
+    main.app.dependency_overrides[get_async_session] = lambda: None
+    main.app.dependency_overrides[get_session] = lambda: None
+    test_client = TestClient(main.app)
+    test_client.reads = reads
+    yield test_client
+    main.app.dependency_overrides.clear()
+
+def test_products_list_sends_etag(client):
+    response = client.get("/products", params={"limit": 100})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == ETAG
+    body = orjson.loads(response.content)
+    assert body["products"][0] == {"id": 1, "name": "Хлеб белый", "category": "Выпечка", "price": 45.0,
+                                   "quantity": 100, "expiration_date": None, "supplier_id": 1}
+    assert body["count"] == 1 and body["next_after_id"] is None
+
+def test_products_not_modified_skips_rows(client):
+    response = client.get("/products", params={"limit": 100}, headers={"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == ETAG
+    assert client.reads == []
+
+def test_products_stale_etag_reads_rows(client):
+    response = client.get("/products", params={"limit": 100}, headers={"If-None-Match": 'W/"products-41-100-None"'})
+    assert response.status_code == 200
+    assert client.reads == [(100, None)]
+
+def test_order_items_not_modified(client):
+    etag = main.make_etag("order_items", 7, 100, None)
+    response = client.get("/order-items", params={"limit": 100}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert client.reads == []
@@ -0,0 +1,177 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from idempotency import IdempotencyMiddleware, ResponseCache, StoredResponse, request_fingerprint
+
+class FakeStore:
+    """IdempotencyStore в памяти: те же правила занятия ключа, что у таблицы idempotency_keys"""
+    def __init__(self):
+        self.rows = {}
+        self.claims = 0
+
+    async def claim(self, key, fingerprint):
+        self.claims += 1
+        if key not in self.rows:
+            self.rows[key] = StoredResponse(fingerprint)
+            return None
+        return self.rows[key]
+
+    async def complete(self, key, fingerprint, response):
+        row = self.rows.get(key)
+        if row is not None and row.fingerprint == fingerprint and row.status_code is None:
+            self.rows[key] = response
+
+    async def release(self, key, fingerprint):
+        row = self.rows.get(key)
+        if row is not None and row.fingerprint == fingerprint and row.status_code is None:
+            del self.rows[key]
+
+    async def purge_expired(self):
+        return 0
+
+def make_app():
+    app = FastAPI()
+    app.state.calls = 0
+    app.state.fail = False
+
+    @app.post("/orders")
+    async def create_order(request: Request):
+        app.state.calls += 1
+        if app.state.fail:
+            return JSONResponse({"detail": "ошибка"}, status_code=503)
+        return {"id": app.state.calls, "body": (await request.json())}
+
+    @app.post("/import/products")
+    async def import_products(request: Request):
+        app.state.calls += 1
+        return {"size": len(await request.body())}
+
+    return app
+
+@pytest.fixture
+def setup():
+    app = make_app()
+    middleware = IdempotencyMiddleware(app, get_engine=None, cache=ResponseCache(), max_body=1024)
+    middleware.store = FakeStore()
+    return app, middleware, TestClient(middleware)
+
+def post(client, path="/orders", key="key-1", json=None, content=None, **kwargs):
+    headers = {"Idempotency-Key": key} if key else {}
+    if content is not None:
+        return client.post(path, content=content, headers=headers, **kwargs)
+    return client.post(path, json=json if json is not None else {"customer_id": 1}, headers=headers, **kwargs)
+
+def test_replay_returns_stored_response(setup):
+    app, middleware, client = setup
+    first = post(client)
+    second = post(client)
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json() == {"id": 1, "body": {"customer_id": 1}}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert "Idempotent-Replayed" not in first.headers
+    assert app.state.calls == 1
+
+def test_replay_is_served_from_memory_cache(setup):
+    app, middleware, client = setup
+    post(client)
+    claims = middleware.store.claims
+    assert post(client).json()["id"] == 1
+    assert middleware.store.claims == claims
+
+def test_replay_from_store_after_cache_loss(setup):
+    app, middleware, client = setup
+    post(client)
+    #другой процесс: в его кэше ответа нет, ответ берётся из таблицы
+    middleware.cache.clear()
+    response = post(client)
+    assert response.json()["id"] == 1
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert app.state.calls == 1
+
+def test_same_key_different_body_is_rejected(setup):
+    app, middleware, client = setup
+    post(client)
+    response = post(client, json={"customer_id": 2})
+    assert response.status_code == 422
+    assert app.state.calls == 1
+
+def test_same_key_different_query_is_rejected(setup):
+    app, middleware, client = setup
+    post(client)
+    assert post(client, params={"x": "1"}).status_code == 422
+
+def test_in_flight_request_gets_409(setup):
+    app, middleware, client = setup
+    fingerprint = request_fingerprint({"method": "POST", "path": "/orders", "query_string": b""},
+                                      b'{"customer_id": 1}')
+    middleware.store.rows["key-1"] = StoredResponse(fingerprint)
+    response = post(client, content=b'{"customer_id": 1}')
+    assert response.status_code == 409
+    assert app.state.calls == 0
+
+def test_server_error_is_not_stored(setup):
+    app, middleware, client = setup
+    app.state.fail = True
+    assert post(client).status_code == 503
+    assert "key-1" not in middleware.store.rows
+    app.state.fail = False
+    response = post(client)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert app.state.calls == 2
+
+def test_different_keys_run_separately(setup):
+    app, middleware, client = setup
+    assert post(client, key="key-1").json()["id"] == 1
+    assert post(client, key="key-2").json()["id"] == 2
+
+def test_request_without_key_passes_through(setup):
+    app, middleware, client = setup
+    post(client, key=None)
+    post(client, key=None)
+    assert app.state.calls == 2
+    assert middleware.store.claims == 0
+
+def test_other_routes_are_not_buffered_or_stored(setup):
+    app, middleware, client = setup
+    #загрузка CSV больше предела тела не ограничивается и не сохраняется
+    response = post(client, path="/import/products", content=b"x" * 4096)
+    assert response.json() == {"size": 4096}
+    assert middleware.store.claims == 0
+
+def test_keyed_body_over_limit_gets_413(setup):
+    app, middleware, client = setup
+    response = post(client, json={"note": "x" * 2048})
+    assert response.status_code == 413
+    assert app.state.calls == 0
+
+def test_too_long_key_gets_400(setup):
+    app, middleware, client = setup
+    assert post(client, key="k" * 201).status_code == 400
+
+def test_fingerprint_covers_method_path_query_and_body():
+    scope = {"method": "POST", "path": "/orders", "query_string": b""}
+    base = request_fingerprint(scope, b"{}")
+    assert base == request_fingerprint(dict(scope), b"{}")
+    assert base != request_fingerprint({**scope, "path": "/returns"}, b"{}")
+    assert base != request_fingerprint({**scope, "query_string": b"x=1"}, b"{}")
+    assert base != request_fingerprint(scope, b'{"a": 1}')
+
+def test_response_cache_ttl(clock):
+    cache = ResponseCache(ttl=10, max_size=10)
+    cache.put("a", StoredResponse("f", 200))
+    clock.advance(9)
+    assert cache.get("a").status_code == 200
+    clock.advance(2)
+    assert cache.get("a") is None
+
+def test_response_cache_evicts_least_recently_used(clock):
+    cache = ResponseCache(ttl=10, max_size=2)
+    cache.put("a", StoredResponse("f", 200))
+    cache.put("b", StoredResponse("f", 201))
+    cache.get("a")
+    cache.put("c", StoredResponse("f", 202))
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None